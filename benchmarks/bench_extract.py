@@ -0,0 +1,76 @@
+"""
+Benchmark window.IBU_HOTEL extraction.
+
+Compares the previous extraction (XPath over every script, a DOTALL regex,
+json.loads, done twice per page as AsyncHotelSpider.parse did) with the
+single-pass extractor in trip.payload.
+
+    python -m benchmarks.bench_extract --output bench_results/extract.json
+"""
+import argparse
+import json
+import re
+import time
+
+from benchmarks.fixtures import SCRAPER_DIR, add_project_to_path, load_pages, write_results
+
+add_project_to_path(SCRAPER_DIR)
+
+from scrapy.http import HtmlResponse  # noqa: E402
+from trip import payload  # noqa: E402
+
+
+def legacy_extract(response):
+    script_content = response.xpath('//script[contains(text(), "window.IBU_HOTEL")]/text()').get()
+    if not script_content:
+        return None
+    match = re.search(r"window\.IBU_HOTEL\s*=\s*(\{.*?\});", script_content, re.DOTALL)
+    return json.loads(match.group(1)) if match else None
+
+
+def legacy_parse(response):
+    # parse() extracted and decoded the payload twice per page.
+    legacy_extract(response)
+    return legacy_extract(response)
+
+
+def single_pass_parse(response):
+    return payload.extract_ibu_hotel(response.text)
+
+
+def run(pages, parse, rounds):
+    started = time.perf_counter()
+    parsed = 0
+    for _ in range(rounds):
+        for name, html in pages.items():
+            # A fresh response per page so no parsing work is shared between runs.
+            response = HtmlResponse(url=f"https://uk.trip.com/hotels/list?city={name}", body=html, encoding="utf-8")
+            if parse(response) is not None:
+                parsed += 1
+    elapsed = time.perf_counter() - started
+    return {"pages": parsed, "seconds": round(elapsed, 4), "pages_per_second": round(parsed / elapsed, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=10, help="Copies of each city's hotels per synthetic page")
+    parser.add_argument("--padding", type=int, default=1_000_000, help="Bytes of unrelated script per synthetic page")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    pages = load_pages(args.repeat, args.padding)
+    legacy = run(pages, legacy_parse, args.rounds)
+    single_pass = run(pages, single_pass_parse, args.rounds)
+    write_results({
+        "benchmark": "extract",
+        "orjson": payload.orjson is not None,
+        "page_count": len(pages),
+        "legacy": legacy,
+        "single_pass": single_pass,
+        "speedup": round(single_pass["pages_per_second"] / legacy["pages_per_second"], 2),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
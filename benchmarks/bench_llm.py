@@ -0,0 +1,158 @@
+"""
+Benchmark the LLM commands end to end against the fake Gemini server.
+
+Seeds a synthetic catalogue of Hotel rows (deterministic for a given
+--seed), starts benchmarks.fake_gemini with the requested latency, error
+and 429 behaviour, and runs rewrite_hotel_data and/or
+generate_summaries_and_ratings once per --concurrency value, reporting
+end-to-end hotels/sec. Uses a temporary SQLite database unless --postgres
+is given, in which case the configured database must be a scratch one.
+
+    python -m benchmarks.bench_llm --hotels 10000 --concurrency 1,8,32 --output bench_results/llm.json
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.fake_gemini import FakeGeminiServer, add_server_arguments
+from benchmarks.fixtures import LLM_DIR, add_project_to_path, write_results
+
+add_project_to_path(LLM_DIR)
+
+WORDS = (
+    "quiet modern spacious central cosy family beach garden pool view rooftop "
+    "breakfast business airport historic boutique luxury budget river lake"
+).split()
+
+
+def setup_django(database_path=None):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "llm.settings")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import django
+    from django.conf import settings
+
+    if database_path:
+        settings.DATABASES["default"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": database_path,
+        }
+    django.setup()
+
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+
+def seed_catalogue(count, seed, batch_size=5000):
+    """Replace the hotels with `count` synthetic ones generated from `seed`."""
+    from llm_commands.models import Hotel
+
+    rng = random.Random(seed)
+    Hotel.objects.all().delete()
+    for start in range(0, count, batch_size):
+        Hotel.objects.bulk_create(
+            Hotel(
+                hotel_id=f"bench-{number}",
+                property_title=f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} Hotel {number}",
+                description=" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 160))),
+                city_name=f"City {number % 50}",
+                price=round(rng.uniform(20, 400), 2),
+            )
+            for number in range(start, min(start + batch_size, count))
+        )
+
+
+def run_command(name, hotels, server, options):
+    """Run one command with `options` and return its timings and metrics."""
+    from django.core.management import call_command
+
+    with tempfile.TemporaryDirectory() as directory:
+        metrics_path = os.path.join(directory, "metrics.json")
+        before = dict(server.stats)
+        started = time.perf_counter()
+        call_command(
+            name,
+            provider="gemini",
+            no_cache=True,
+            force=True,
+            metrics_json=metrics_path,
+            stdout=io.StringIO(),
+            **options,
+        )
+        elapsed = time.perf_counter() - started
+        with open(metrics_path) as f:
+            metrics = json.load(f)
+
+    return {
+        "command": name,
+        **options,
+        "hotels": hotels,
+        "seconds": round(elapsed, 3),
+        "hotels_per_second": round(hotels / elapsed, 2) if elapsed else 0.0,
+        "server": {key: server.stats[key] - before[key] for key in server.stats},
+        "metrics": metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hotels", type=int, default=1000, help="Size of the synthetic catalogue")
+    parser.add_argument("--commands", default="rewrite,generate", help="Comma-separated: rewrite, generate")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels to compare")
+    parser.add_argument("--rate", type=float, default=1000.0, help="Client rate limit in requests per second")
+    parser.add_argument("--pack-size", type=int, default=1, help="Hotels per rewrite prompt")
+    parser.add_argument("--postgres", action="store_true", help="Use the configured database instead of SQLite")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    commands = {
+        "rewrite": ("rewrite_hotel_data", {"pack_size": args.pack_size}),
+        "generate": ("generate_summaries_and_ratings", {}),
+    }
+    levels = [int(level) for level in args.concurrency.split(",") if level]
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(None if args.postgres else os.path.join(directory, "bench.sqlite3"))
+
+        server = FakeGeminiServer(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            burst_every=args.burst_every,
+            burst_length=args.burst_length,
+            retry_after=args.retry_after,
+            seed=args.seed,
+        )
+        os.environ["GEMINI_API_KEY"] = "benchmark"
+        os.environ["GEMINI_BASE_URL"] = server.url
+
+        runs = []
+        with server:
+            for key in args.commands.split(","):
+                name, options = commands[key.strip()]
+                for concurrency in levels:
+                    # Every run starts from the same catalogue.
+                    seed_catalogue(args.hotels, args.seed)
+                    runs.append(run_command(
+                        name, args.hotels, server, dict(options, concurrency=concurrency, rate=args.rate)
+                    ))
+
+    write_results({
+        "benchmark": "llm",
+        "hotels": args.hotels,
+        "seed": args.seed,
+        "server": {
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "burst_every": args.burst_every,
+            "burst_length": args.burst_length,
+        },
+        "runs": runs,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark the scraper's parsing and database pipeline.
+
+Replays the landing page through AsyncHotelSpider.parse and every city page
+through parse_city_hotels, then upserts the scraped items through
+PostgresPipeline twice (first inserting, then updating the same hotels).
+Writes to a temporary SQLite database, created from the scraper's Core
+table, unless --database-url points at a scratch Postgres database that
+the Django migrations have already been run against.
+
+    python -m benchmarks.bench_scraper --output bench_results/scraper.json
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import (
+    SCRAPER_DIR,
+    add_project_to_path,
+    load_landing_page,
+    load_pages,
+    write_results,
+)
+
+add_project_to_path(SCRAPER_DIR)
+
+import scrapy  # noqa: E402
+from scrapy.http import HtmlResponse  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from trip.db.models import metadata  # noqa: E402
+from trip.pipelines import PostgresPipeline  # noqa: E402
+from trip.spiders.async_trip_spider import AsyncHotelSpider  # noqa: E402
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def rate(count, seconds):
+    return round(count / seconds, 2) if seconds else 0.0
+
+
+def split_output(results):
+    items = [result for result in results if isinstance(result, dict)]
+    return items, len(results) - len(items)
+
+
+def bench_parse(landing_page, rounds):
+    """Time AsyncHotelSpider.parse over the landing page."""
+    spider = AsyncHotelSpider(cities="all")
+    url = AsyncHotelSpider.start_urls[0]
+    items = requests = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        response = HtmlResponse(url=url, body=landing_page, encoding="utf-8")
+        page_items, page_requests = split_output(list(spider.parse(response)))
+        items += len(page_items)
+        requests += page_requests
+    elapsed = time.perf_counter() - started
+    return {
+        "pages": rounds,
+        "items": items,
+        "requests": requests,
+        "seconds": round(elapsed, 4),
+        "pages_per_second": rate(rounds, elapsed),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_city_pages(pages, rounds):
+    """Time parse_city_hotels over every city page; returns the stats and the last round's items."""
+    pages_parsed = items_count = 0
+    elapsed = 0.0
+    for _ in range(rounds):
+        # A fresh spider per round, so hotels aren't deduplicated across rounds.
+        spider = AsyncHotelSpider(cities="all")
+        items = []
+        for city_id, (name, html) in enumerate(pages.items(), start=1):
+            url = f"https://uk.trip.com/hotels/list?city={city_id}"
+            request = scrapy.Request(url, meta={"city_name": name, "city_id": str(city_id), "page": 1})
+            response = HtmlResponse(url=url, body=html, encoding="utf-8", request=request)
+            started = time.perf_counter()
+            page_items, _ = split_output(list(spider.parse_city_hotels(response)))
+            elapsed += time.perf_counter() - started
+            items.extend(page_items)
+            pages_parsed += 1
+        items_count += len(items)
+    return {
+        "pages": pages_parsed,
+        "items": items_count,
+        "seconds": round(elapsed, 4),
+        "pages_per_second": rate(pages_parsed, elapsed),
+        "items_per_second": rate(items_count, elapsed),
+        "peak_rss_mb": peak_rss_mb(),
+    }, items
+
+
+def bench_pipeline(items, engine, batch_size):
+    """Push `items` through PostgresPipeline and time the run, including the final flush."""
+    spider = AsyncHotelSpider(cities="all")
+    pipeline = PostgresPipeline(batch_size=batch_size, flush_interval=float("inf"), engine=engine)
+    started = time.perf_counter()
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    elapsed = time.perf_counter() - started
+    return {
+        "items": len(items),
+        "rows_written": pipeline.rows_written,
+        "batches": pipeline.batches_written,
+        "seconds": round(elapsed, 4),
+        "items_per_second": rate(len(items), elapsed),
+        "database_seconds": round(pipeline.write_seconds, 4),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=10, help="Copies of each city's hotels per synthetic page")
+    parser.add_argument("--padding", type=int, default=1_000_000, help="Bytes of unrelated script per synthetic page")
+    parser.add_argument("--batch-size", type=int, default=500, help="PostgresPipeline batch size")
+    parser.add_argument("--database-url", help="SQLAlchemy URL of a scratch database (default: temporary SQLite)")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = args.database_url or f"sqlite:///{os.path.join(directory, 'bench.sqlite3')}"
+        engine = create_engine(database_url)
+        if not args.database_url:
+            # The pipeline issues no DDL; in production the Django migrations own the table.
+            metadata.create_all(engine)
+
+        landing_page = load_landing_page(args.padding)
+        pages = {name: html for name, html in load_pages(args.repeat, args.padding).items() if name != "landing"}
+
+        parse = bench_parse(landing_page, args.rounds)
+        city_pages, items = bench_city_pages(pages, args.rounds)
+        insert = bench_pipeline(items, engine, args.batch_size)
+        upsert = bench_pipeline(items, engine, args.batch_size)
+        engine.dispose()
+
+    write_results({
+        "benchmark": "scraper",
+        "database": engine.dialect.name,
+        "page_count": len(pages),
+        "parse": parse,
+        "parse_city_hotels": city_pages,
+        "pipeline_insert": insert,
+        "pipeline_upsert": upsert,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Load-test the sync and async hotel views of a running server.
+
+Sends --requests requests per page with --concurrency requests in flight,
+first to the sync view under /sync/ and then to the async view at the
+public URL, and reports requests/sec and p50/p95/p99 latency for each.
+Detail pages cycle
+through the first hotels of the catalogue, so after the warm-up they are
+served from the fragment cache.
+
+    cd llm && WEB_CONCURRENCY=4 gunicorn llm.asgi:application
+    python -m benchmarks.bench_web --base-url http://127.0.0.1:8000 --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import math
+import time
+
+import aiohttp
+
+from benchmarks.fixtures import write_results
+
+# Page -> public (async) path; the sync view is at /sync<path>.
+PAGES = {
+    "list": "/",
+    "detail": "/hotel/{pk}/",
+    "api-list": "/api/hotels/",
+    "api-detail": "/api/hotels/{pk}/",
+}
+
+
+def percentile(latencies, fraction):
+    """Nearest-rank percentile of a sorted list, in milliseconds."""
+    if not latencies:
+        return None
+    rank = max(1, math.ceil(fraction * len(latencies)))
+    return round(latencies[rank - 1] * 1000, 2)
+
+
+async def hotel_ids(session, base_url, count):
+    """The ids of the first `count` hotels, for the detail pages."""
+    async with session.get(f"{base_url}/api/hotels/", params={"limit": count}) as response:
+        response.raise_for_status()
+        return [row["id"] for row in (await response.json())["results"]]
+
+
+async def load(session, urls, requests, concurrency):
+    """Fetch `requests` URLs (cycling through `urls`) with `concurrency` workers."""
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for number in remaining:
+            started = time.perf_counter()
+            try:
+                async with session.get(urls[number % len(urls)]) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except aiohttp.ClientError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+async def run(args):
+    base_url = args.base_url.rstrip("/")
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        ids = await hotel_ids(session, base_url, args.detail_hotels)
+        if not ids:
+            raise SystemExit("The server has no hotels; seed the database first.")
+
+        results = []
+        for page in args.pages.split(","):
+            path = PAGES[page.strip()]
+            for prefix in ("/sync", ""):
+                urls = [f"{base_url}{prefix}{path.format(pk=pk)}" for pk in ids]
+                await load(session, urls, args.warmup, args.concurrency)
+                stats = await load(session, urls, args.requests, args.concurrency)
+                results.append({"page": page, "view": "sync" if prefix else "async", **stats})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--pages", default=",".join(PAGES), help="Comma-separated: " + ", ".join(PAGES))
+    parser.add_argument("--requests", type=int, default=1000, help="Measured requests per page and view")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured requests before each run")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    parser.add_argument("--detail-hotels", type=int, default=100, help="Hotels the detail pages cycle through")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    write_results({
+        "benchmark": "web",
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "runs": asyncio.run(run(args)),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
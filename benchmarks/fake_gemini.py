@@ -0,0 +1,201 @@
+"""
+Local stand-in for the Gemini generateContent API.
+
+Answers every POST .../<model>:generateContent with a response in the
+Gemini schema, after a delay drawn from a latency distribution. A fraction
+of requests can fail with 500/503, and bursts of 429s with Retry-After can
+be injected every N requests, to see how the commands cope with throttling.
+
+Run it on its own and point the commands at it:
+
+    python -m benchmarks.fake_gemini --port 8089 --latency lognormal:0.3,0.5 --burst-every 500
+    GEMINI_BASE_URL=http://127.0.0.1:8089 python manage.py rewrite_hotel_data
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fixtures import LLM_DIR, add_project_to_path
+
+add_project_to_path(LLM_DIR)
+
+from llm_commands.packing import estimate_tokens  # noqa: E402
+from llm_commands.providers import fake_response_text  # noqa: E402
+
+
+def parse_latency(spec):
+    """
+    Turn a latency spec into a function of a random.Random returning seconds.
+
+    fixed:S             always S seconds
+    uniform:LOW,HIGH    uniformly distributed
+    exponential:MEAN    exponentially distributed with the given mean
+    lognormal:MEDIAN,SIGMA
+                        log-normal with the given median; long-tailed like real APIs
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exponential" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] else 0.0
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0]) if values[0] else float("-inf")
+        return lambda rng: rng.lognormvariate(mu, values[1]) if values[0] else 0.0
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+class FakeGeminiServer:
+    """
+    Threaded HTTP/1.1 server answering generateContent requests.
+
+    Every `burst_every` requests, the next `burst_length` requests are
+    answered with 429 and `Retry-After: retry_after`; otherwise a request
+    fails with 500 or 503 with probability `error_rate`. Random choices come
+    from a seeded generator, so runs are repeatable. Use it as a context
+    manager, or call start()/stop().
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency="fixed:0", error_rate=0.0,
+                 burst_every=0, burst_length=0, retry_after=1, seed=0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "throttled": 0, "errors": 0}
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def decide(self):
+        """Pick (status, delay) for the next request."""
+        with self.lock:
+            self.stats["requests"] += 1
+            number = self.stats["requests"]
+            delay = max(0.0, self.latency(self.rng))
+            if self.burst_every and self.burst_length and number > self.burst_every:
+                if (number - 1) % self.burst_every < self.burst_length:
+                    self.stats["throttled"] += 1
+                    return 429, 0.0
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return self.rng.choice((500, 503)), delay
+            self.stats["ok"] += 1
+            return 200, delay
+
+    def handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.split("?")[0].endswith(":generateContent"):
+                    return self.reply(404, {"error": {"code": 404, "message": "Not found"}})
+
+                status, delay = fake.decide()
+                if delay:
+                    time.sleep(delay)
+                if status == 429:
+                    return self.reply(
+                        429,
+                        {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}},
+                        {"Retry-After": str(fake.retry_after)},
+                    )
+                if status != 200:
+                    return self.reply(status, {"error": {"code": status, "status": "UNAVAILABLE"}})
+
+                try:
+                    prompt = json.loads(body)["contents"][0]["parts"][0]["text"]
+                except (LookupError, TypeError, ValueError):
+                    return self.reply(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT"}})
+                text = fake_response_text(prompt)
+                self.reply(200, {
+                    "candidates": [{
+                        "content": {"parts": [{"text": text}], "role": "model"},
+                        "finishReason": "STOP",
+                    }],
+                    "usageMetadata": {
+                        "promptTokenCount": estimate_tokens(prompt),
+                        "candidatesTokenCount": estimate_tokens(text),
+                    },
+                })
+
+            def reply(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--latency", default="lognormal:0.3,0.5", help="Latency distribution (see parse_latency)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500/503")
+    parser.add_argument("--burst-every", type=int, default=0, help="Start a burst of 429s every N requests")
+    parser.add_argument("--burst-length", type=int, default=0, help="Number of 429s per burst")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(
+        args.host, args.port, args.latency, args.error_rate,
+        args.burst_every, args.burst_length, args.retry_after, args.seed,
+    )
+    print(f"Fake Gemini API listening on {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+        print(json.dumps(server.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Fixtures shared by the benchmarks.
+
+Recorded Trip.com pages can be dropped into benchmarks/fixtures/ as
+<name>.html, with the hotels landing page saved as landing.html. When none
+are present, synthetic pages are built from the scraped city files in
+scraper/city_data/json_of_hotels, reshaped into the window.IBU_HOTEL
+structure the spider parses.
+"""
+import json
+import os
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SCRAPER_DIR = ROOT_DIR / "scraper"
+LLM_DIR = ROOT_DIR / "llm"
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+CITY_JSON_DIR = SCRAPER_DIR / "city_data" / "json_of_hotels"
+
+
+def add_project_to_path(project_dir):
+    """Make the scraper or Django project importable from a benchmark script."""
+    path = str(project_dir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def raw_hotel(hotel):
+    """Reshape a scraped hotel back into the structure of a Trip.com hotelList entry."""
+    return {
+        "hotelBasicInfo": {
+            "hotelId": hotel.get("hotel_id"),
+            "hotelName": hotel.get("property_title"),
+            "hotelImg": hotel.get("image"),
+            "price": hotel.get("price"),
+        },
+        "commentInfo": {"commentScore": hotel.get("rating")},
+        "positionInfo": {
+            "positionName": hotel.get("address"),
+            "coordinate": {"lat": hotel.get("latitude"), "lng": hotel.get("longitude")},
+        },
+        "roomInfo": {"physicalRoomName": hotel.get("room_type")},
+    }
+
+
+def build_page(payload, padding_bytes=1_000_000):
+    """
+    Wrap a window.IBU_HOTEL payload in an HTML page.
+
+    Real pages carry several large unrelated scripts; `padding_bytes` of
+    filler script is added before the payload so extraction has to skip it.
+    """
+    filler = json.dumps({"filler": "x" * padding_bytes})
+    return (
+        "<!DOCTYPE html><html><head><title>Trip.com</title>"
+        f"<script>window.__APP_STATE__ = {filler};</script>"
+        "</head><body><div id=\"main\"></div>"
+        f"<script>window.IBU_HOTEL = {json.dumps(payload, ensure_ascii=False)};"
+        "window.IBU_HOTEL_READY = true;</script>"
+        "</body></html>"
+    )
+
+
+def city_payload(hotels, cities=()):
+    return {
+        "initData": {
+            "htlsData": {"inboundCities": list(cities), "outboundCities": []},
+            "firstPageList": {"hotelList": [raw_hotel(hotel) for hotel in hotels]},
+        }
+    }
+
+
+def synthetic_pages(repeat=10, padding_bytes=1_000_000):
+    """
+    Return {name: html} with one page per scraped city.
+
+    Each city's hotels are repeated `repeat` times (with distinct ids) to get
+    payloads of a realistic size.
+    """
+    pages = {}
+    for path in sorted(CITY_JSON_DIR.glob("*.json")):
+        with open(path, encoding="utf-8") as f:
+            hotels = json.load(f)
+        if not hotels:
+            continue
+        expanded = [
+            dict(hotel, hotel_id=f"{hotel.get('hotel_id')}-{copy}")
+            for copy in range(repeat)
+            for hotel in hotels
+        ]
+        pages[path.stem] = build_page(city_payload(expanded), padding_bytes)
+    return pages
+
+
+def synthetic_landing_page(padding_bytes=1_000_000):
+    """Build a landing page listing one inbound city per scraped city file."""
+    cities = [
+        {"id": str(index), "name": path.stem}
+        for index, path in enumerate(sorted(CITY_JSON_DIR.glob("*.json")), start=1)
+    ]
+    return build_page(city_payload([], cities), padding_bytes)
+
+
+def load_landing_page(padding_bytes=1_000_000):
+    """Return the recorded landing page if there is one, else a synthetic one."""
+    path = FIXTURES_DIR / "landing.html"
+    if path.is_file():
+        return path.read_text(encoding="utf-8")
+    return synthetic_landing_page(padding_bytes)
+
+
+def load_pages(repeat=10, padding_bytes=1_000_000):
+    """Return recorded pages from benchmarks/fixtures/ if any, else synthetic ones."""
+    recorded = {
+        path.stem: path.read_text(encoding="utf-8")
+        for path in sorted(FIXTURES_DIR.glob("*.html"))
+    } if FIXTURES_DIR.is_dir() else {}
+    return recorded or synthetic_pages(repeat, padding_bytes)
+
+
+def write_results(results, output=None):
+    """Print benchmark results as JSON and optionally save them to `output`."""
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
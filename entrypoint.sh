@@ -2,7 +2,14 @@
 
 if [ "$SERVICE" = "django" ]; then
   echo "Starting Django service..."
-  wait-for-it db:5432 -- python manage.py migrate && python manage.py runserver 0.0.0.0:8000
+  # The migrations own the hotels table the scraper writes to; docker-compose
+  # starts the crawler only once this service is healthy.
+  python manage.py migrate --noinput || exit 1
+  if [ "$DJANGO_RUNSERVER" = "1" ]; then
+    exec python manage.py runserver 0.0.0.0:8000
+  fi
+  # Production ASGI server: gunicorn managing uvicorn workers (see gunicorn.conf.py).
+  exec gunicorn llm.asgi:application
 elif [ "$SERVICE" = "scrapy" ]; then
   echo "Starting Scrapy service..."
   cd /usr/src/scraper && scrapy crawl async_trip
@@ -0,0 +1,17 @@
+# Gunicorn settings for serving llm.asgi:application; gunicorn reads this
+# file from the working directory (the container's /usr/src/app).
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+# Each worker is a separate process running uvicorn's event loop, so async
+# views interleave within a worker and workers spread over the CPUs.
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+# Restart workers now and then to bound memory growth.
+max_requests = 10000
+max_requests_jitter = 1000
+accesslog = "-"
@@ -130,3 +130,50 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Gemini response cache shared by the LLM management commands
+LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', os.path.join(BASE_DIR, 'llm_cache.sqlite3'))
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 30 * 24 * 60 * 60))  # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 100000))
+
+# Rendered hotel pages, one entry per hotel, plus the admin's cached filter
+# choices. The file backend is shared by every process using the same
+# directory, so the LLM commands can invalidate pages served by the web
+# workers; a local-memory cache would only be cleared in the writing process.
+# The scraper doesn't invalidate pages; each page is stored with the scraped
+# columns it shows and re-rendered when a re-crawl changes them.
+# MAX_ENTRIES should exceed the number of hotels: past it Django deletes a
+# random 1/CULL_FREQUENCY of the files. Each set (a page cache miss) lists
+# the directory to check the limit.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', os.path.join(BASE_DIR, 'django_cache')),
+        'TIMEOUT': int(os.environ.get('HOTEL_FRAGMENT_TIMEOUT', 24 * 60 * 60)),  # seconds
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('HOTEL_FRAGMENT_MAX_ENTRIES', 100000)),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
+# Hotels per page in the hotel list view
+HOTEL_PAGE_SIZE = int(os.environ.get('HOTEL_PAGE_SIZE', 50))
+
+# Logging is configured here rather than by the management commands, so
+# importing a command has no side effects. LOG_LEVEL=DEBUG restores the old
+# verbosity; raw API payloads are only logged with --log-payloads.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s - %(levelname)s - %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.environ.get('LOG_LEVEL', 'INFO'),
+    },
+}
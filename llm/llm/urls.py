@@ -15,8 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from django.urls import include, path
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('', include('llm_commands.urls')),
 ]
+
+# runserver served the admin's static files itself; gunicorn doesn't. This
+# only adds routes when DEBUG is on.
+urlpatterns += staticfiles_urlpatterns()
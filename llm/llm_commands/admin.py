@@ -1,21 +1,156 @@
+import json
+
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.text import Truncator
 from .models import Hotel, Summary, PropertyRating
 
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that asks the Postgres planner for the row count instead of
+    running COUNT(*), which has to scan millions of rows on every page load.
+
+    The planner's estimate comes from table statistics, so it is only used
+    above `exact_below` rows; smaller results (and other databases) get an
+    exact count.
+    """
+
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql":
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]["Plan"]["Plan Rows"])
+            if estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+
+class CachedChoicesFilter(admin.SimpleListFilter):
+    """
+    Filter on a column's distinct values, read once and cached instead of
+    running SELECT DISTINCT over the whole table on every page load. New
+    values show up once the cache entry expires.
+    """
+
+    field = None
+    cache_timeout = 60 * 60
+
+    def lookups(self, request, model_admin):
+        key = f"admin:choices:{model_admin.model._meta.label_lower}:{self.field}"
+        values = cache.get(key)
+        if values is None:
+            values = list(
+                model_admin.model._default_manager
+                .exclude(**{f"{self.field}__isnull": True})
+                .order_by(self.field)
+                .values_list(self.field, flat=True)
+                .distinct()
+            )
+            cache.set(key, values, self.cache_timeout)
+        return [(value, value) for value in values]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field: self.value()})
+        return queryset
+
+
+class CityFilter(CachedChoicesFilter):
+    title = "city"
+    parameter_name = "city"
+    field = "city_name"
+
+
+class RatingRangeFilter(admin.SimpleListFilter):
+    """Fixed rating bands, so the filter needs no query to build its choices."""
+
+    title = "rating"
+    parameter_name = "rating_range"
+    field = "rating"
+    ranges = {
+        "4.5+": (4.5, None),
+        "4-4.5": (4.0, 4.5),
+        "3-4": (3.0, 4.0),
+        "<3": (None, 3.0),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, key) for key in self.ranges] + [("none", "Unrated")]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value == "none":
+            return queryset.filter(**{f"{self.field}__isnull": True})
+        if value not in self.ranges:
+            return queryset
+        low, high = self.ranges[value]
+        if low is not None:
+            queryset = queryset.filter(**{f"{self.field}__gte": low})
+        if high is not None:
+            queryset = queryset.filter(**{f"{self.field}__lt": high})
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables with millions of rows: estimated page
+    counts, no second COUNT(*) of the unfiltered table while searching,
+    and truncated text columns.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    excerpt_length = 80
+
+    def excerpt(self, text):
+        return Truncator(text or "").chars(self.excerpt_length)
+
+
+# Searches use the pg_trgm indexes on UPPER(property_title) and UPPER(city_name)
+# from migration 0005, or an exact match on the unique hotel_id ("=").
+
 @admin.register(Hotel)
-class HotelAdmin(admin.ModelAdmin):
+class HotelAdmin(LargeTableAdmin):
     list_display = ("property_title", "city_name", "price", "rating")
-    search_fields = ("property_title", "city_name")
-    list_filter = ("city_name", "rating")
+    search_fields = ("property_title", "city_name", "=hotel_id")
+    list_filter = (CityFilter, RatingRangeFilter)
 
 
 @admin.register(Summary)
-class SummaryAdmin(admin.ModelAdmin):
-    list_display = ("property", "summary")
-    search_fields = ("property__property_title",)
+class SummaryAdmin(LargeTableAdmin):
+    list_display = ("property", "summary_excerpt", "is_current", "created_at")
+    list_select_related = ("property",)
+    search_fields = ("property__property_title", "=property__hotel_id")
+    list_filter = ("is_current",)
+    raw_id_fields = ("property",)
+
+    @admin.display(description="summary")
+    def summary_excerpt(self, obj):
+        return self.excerpt(obj.summary)
 
 
 @admin.register(PropertyRating)
-class PropertyRatingAdmin(admin.ModelAdmin):
-    list_display = ("property", "rating", "review")
-    search_fields = ("property__property_title", "review")
-    list_filter = ("rating",)
+class PropertyRatingAdmin(LargeTableAdmin):
+    list_display = ("property", "rating", "review_excerpt", "is_current", "created_at")
+    list_select_related = ("property",)
+    search_fields = ("property__property_title", "=property__hotel_id")
+    list_filter = (RatingRangeFilter, "is_current")
+    raw_id_fields = ("property",)
+
+    @admin.display(description="review")
+    def review_excerpt(self, obj):
+        return self.excerpt(obj.review)
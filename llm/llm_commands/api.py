@@ -0,0 +1,255 @@
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.views.decorators.http import require_GET
+from .models import Hotel
+from .search import SearchNotSupported, search_hotels
+
+# Columns returned for every hotel. Rows are read with .values(), so no
+# model instances are built.
+API_FIELDS = (
+    "id",
+    "hotel_id",
+    "property_title",
+    "city_name",
+    "price",
+    "rating",
+    "address",
+    "latitude",
+    "longitude",
+    "room_type",
+    "image",
+)
+DETAIL_FIELDS = API_FIELDS + ("description", "current_summary", "current_rating", "current_review")
+
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+
+def finite_float(value):
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(value)
+    return number
+
+
+# Query parameter -> (lookup, converter raising ValueError)
+FILTERS = {
+    "city": ("city_name", str),
+    "min_price": ("price__gte", finite_float),
+    "max_price": ("price__lte", finite_float),
+    "min_rating": ("rating__gte", finite_float),
+    "max_rating": ("rating__lte", finite_float),
+}
+
+
+def filter_hotels(queryset, params):
+    """
+    Apply the city/price/rating filters in `params` to `queryset`.
+
+    Raises ValueError naming the parameter when a value isn't valid.
+    """
+    lookups = {}
+    for name, (lookup, kind) in FILTERS.items():
+        value = params.get(name)
+        if value in (None, ""):
+            continue
+        try:
+            lookups[lookup] = kind(value)
+        except ValueError:
+            raise ValueError(f"Invalid value for {name}: {value!r}") from None
+    return queryset.filter(**lookups)
+
+
+def int_param(params, name, default, minimum):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid value for {name}: {value!r}") from None
+    if number < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return number
+
+
+def error_response(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def conditional_json(request, data):
+    """
+    Return `data` as JSON with an ETag, or a 304 if the client already has it.
+
+    The ETag is a hash of the body, so it changes exactly when the data does.
+    """
+    response = JsonResponse(data)
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response["ETag"], response=response)
+
+
+def list_query(request):
+    """
+    Return (queryset, limit) for a list request; the queryset holds one row
+    more than `limit`, which tells us whether there is a next page.
+
+    Raises ValueError for invalid parameters.
+    """
+    after = int_param(request.GET, "after", None, 0)
+    limit = min(int_param(request.GET, "limit", settings.HOTEL_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    hotels = filter_hotels(Hotel.objects.order_by("pk"), request.GET)
+    if after is not None:
+        hotels = hotels.filter(pk__gt=after)
+    return hotels.values(*API_FIELDS)[:limit + 1], limit
+
+
+def list_payload(rows, limit):
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return {"results": rows[:limit], "next": next_cursor}
+
+
+def detail_query(pk):
+    return Hotel.objects.with_current_results().filter(pk=pk).values(*DETAIL_FIELDS)
+
+
+def detail_payload(row):
+    summary = row.pop("current_summary")
+    rating = row.pop("current_rating")
+    review = row.pop("current_review")
+    row["summary"] = summary
+    row["review"] = {"rating": rating, "review": review} if rating is not None else None
+    return row
+
+
+def ndjson_line(row):
+    return json.dumps(row, cls=DjangoJSONEncoder, separators=(",", ":")) + "\n"
+
+
+def ndjson_response(lines):
+    response = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+    response["Content-Disposition"] = 'attachment; filename="hotels.ndjson"'
+    return response
+
+
+@require_GET
+def hotel_list(request):
+    """
+    GET /api/hotels/?city=&min_price=&max_price=&min_rating=&max_rating=&after=&limit=
+
+    Hotels in primary key order. `next` is the `after` value for the next
+    page, or null on the last one.
+    """
+    try:
+        rows, limit = list_query(request)
+    except ValueError as e:
+        return error_response(str(e))
+    return conditional_json(request, list_payload(list(rows), limit))
+
+
+@require_GET
+async def ahotel_list(request):
+    """Async hotel_list, for ASGI servers."""
+    try:
+        rows, limit = list_query(request)
+    except ValueError as e:
+        return error_response(str(e))
+    return conditional_json(request, list_payload([row async for row in rows], limit))
+
+
+@require_GET
+def hotel_detail(request, pk):
+    """GET /api/hotels/<pk>/: one hotel with its current summary, rating and review."""
+    row = detail_query(pk).first()
+    if row is None:
+        return error_response("Hotel not found", status=404)
+    return conditional_json(request, detail_payload(row))
+
+
+@require_GET
+async def ahotel_detail(request, pk):
+    """Async hotel_detail, for ASGI servers."""
+    row = await detail_query(pk).afirst()
+    if row is None:
+        return error_response("Hotel not found", status=404)
+    return conditional_json(request, detail_payload(row))
+
+
+def search_query(request):
+    """
+    Return (text, limit) for a search request.
+
+    Raises ValueError for a missing query or invalid limit.
+    """
+    text = request.GET.get("q", "")
+    if not text.strip():
+        raise ValueError("Missing search query: q")
+    return text, min(int_param(request.GET, "limit", 20, 1), MAX_PAGE_SIZE)
+
+
+@require_GET
+def hotel_search(request):
+    """
+    GET /api/hotels/search/?q=&limit=
+
+    Hotels whose title, description, current summary or review match `q`,
+    best match first, each with its `rank`. 501 on databases without a
+    search index.
+    """
+    try:
+        text, limit = search_query(request)
+    except ValueError as e:
+        return error_response(str(e))
+    try:
+        results = search_hotels(text, API_FIELDS, limit)
+    except SearchNotSupported as e:
+        return error_response(str(e), status=501)
+    return conditional_json(request, {"results": results})
+
+
+@require_GET
+async def ahotel_search(request):
+    """Async hotel_search, for ASGI servers."""
+    try:
+        text, limit = search_query(request)
+    except ValueError as e:
+        return error_response(str(e))
+    try:
+        results = await sync_to_async(search_hotels)(text, API_FIELDS, limit)
+    except SearchNotSupported as e:
+        return error_response(str(e), status=501)
+    return conditional_json(request, {"results": results})
+
+
+@require_GET
+def hotel_export(request):
+    """
+    GET /api/hotels/export.ndjson: every matching hotel, one JSON object per line.
+
+    Rows are streamed from a server-side cursor on Postgres, so memory use
+    doesn't grow with the size of the catalogue.
+    """
+    try:
+        hotels = filter_hotels(Hotel.objects.order_by("pk"), request.GET)
+    except ValueError as e:
+        return error_response(str(e))
+
+    rows = hotels.values(*API_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return ndjson_response(ndjson_line(row) for row in rows)
+
+
+@require_GET
+async def ahotel_export(request):
+    """Async hotel_export, for ASGI servers."""
+    try:
+        hotels = filter_hotels(Hotel.objects.order_by("pk"), request.GET)
+    except ValueError as e:
+        return error_response(str(e))
+
+    rows = hotels.values(*API_FIELDS).aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return ndjson_response(ndjson_line(row) async for row in rows)
@@ -0,0 +1,159 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from llm_commands.batching import BatchBuffer, iter_by_pk
+from llm_commands.cache import ResponseCache
+from llm_commands.metrics import RunMetrics
+from llm_commands.models import Hotel
+from llm_commands.providers import PROVIDERS, create_client
+from llm_commands.throttling import AdaptiveTokenBucket
+from llm_commands.work_state import WorkState, content_hash
+
+
+class LLMCommand(BaseCommand):
+    """
+    Base for the management commands that send every hotel through an LLM.
+
+    Subclasses set `task_name`, build prompts, parse responses and implement
+    `write_batch`. Their `handle()` calls `setup(options)` first, walks
+    `pending_hotels()`, and ends with `finish(processed)` and `report(options)`.
+    """
+
+    task_name = None
+    default_concurrency = 1
+    default_rate = 1.0  # requests per second
+    default_max_attempts = 3
+    default_chunk_size = 500
+    default_batch_size = 100
+    log_payloads = False
+
+    def __init__(self):
+        super().__init__()
+        # Built in handle() from --provider, so options are parsed (and
+        # --help works) without the provider's credentials.
+        self.client = None
+        self.metrics = RunMetrics(self.task_name)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--provider",
+            choices=PROVIDERS,
+            help="LLM backend to use instead of the LLM_PROVIDER setting (default gemini)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=self.default_concurrency,
+            help="Number of LLM requests in flight at once; raise it for local backends",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=self.default_rate,
+            help="Maximum Gemini requests per second; lowered automatically on 429/503",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Always call the API instead of reusing cached responses",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Process every hotel, including ones unchanged since their last successful run",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=self.default_max_attempts,
+            help="Stop retrying a hotel after this many failed runs until its content changes",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=self.default_chunk_size,
+            help="Number of hotels fetched from the database per query",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=self.default_batch_size,
+            help="Number of results written to the database per transaction",
+        )
+        parser.add_argument(
+            "--log-payloads",
+            action="store_true",
+            help="Log every raw API response and parsed result (verbose)",
+        )
+        parser.add_argument(
+            "--metrics-json",
+            help="Also write the JSON metrics summary to this file",
+        )
+        parser.add_argument(
+            "--prometheus-textfile",
+            help="Write run metrics to this file in the Prometheus textfile format",
+        )
+
+    def setup(self, options):
+        """Build the client, work state and write buffers for one run from the parsed options."""
+        self.client = create_client(options.get("provider"))
+        self.metrics = RunMetrics(self.task_name)
+        self.log_payloads = self.client.log_payloads = options.get("log_payloads", False)
+        self.concurrency = max(1, options.get("concurrency") or self.default_concurrency)
+        self.chunk_size = max(1, options.get("chunk_size") or self.default_chunk_size)
+        batch_size = options.get("batch_size") or self.default_batch_size
+        self.client.rate_limiter = AdaptiveTokenBucket(options.get("rate") or self.default_rate)
+        self.client.cache = None if options.get("no_cache") else ResponseCache.from_settings()
+        self.client.configure_pool(self.concurrency)
+        self.work_state = WorkState(
+            self.task_name,
+            max_attempts=options.get("max_attempts") or self.default_max_attempts,
+            force=options.get("force", False),
+            chunk_size=self.chunk_size,
+        )
+        self.writer = BatchBuffer(self.write_batch, batch_size)
+        # Failed attempts are recorded in batches too, so an outage doesn't
+        # cost a round trip per hotel.
+        self.failures = BatchBuffer(self.work_state.mark_failed, batch_size)
+
+    def call_gemini_api(self, prompt, generation_config=None):
+        """Call the configured LLM provider (Gemini by default); returns None on failure."""
+        return self.client.generate(prompt, generation_config)
+
+    def iter_hotels(self, chunk_size):
+        """Stream hotels in primary-key order, loading only the fields the prompts use."""
+        hotels = Hotel.objects.only("id", "property_title", "description")
+        return iter_by_pk(hotels, chunk_size)
+
+    def hotel_hash(self, hotel):
+        """Hash of the hotel content the prompts are built from."""
+        return content_hash(hotel.property_title, hotel.description)
+
+    def pending_hotels(self):
+        """Hotels that still need processing this run, with their fetch time recorded."""
+        pending = self.work_state.pending(self.iter_hotels(self.chunk_size), self.hotel_hash)
+        return self.metrics.timed_iter("db_fetch", pending)
+
+    def write_batch(self, results):
+        """Save a batch of finished results; implemented by each command."""
+        raise NotImplementedError
+
+    def finish(self, processed):
+        """Write the results and failures still buffered at the end of a run."""
+        self.writer.flush()
+        self.failures.flush()
+        self.metrics.hotels = processed
+
+    def report(self, options):
+        """Print and export the run metrics, then release the client."""
+        self.write_metrics(options)
+        self.client.close()
+
+    def write_metrics(self, options):
+        summary = self.metrics.summary(self.client)
+        self.stdout.write(json.dumps(summary, indent=2))
+        if options.get("metrics_json"):
+            RunMetrics.write_json(summary, options["metrics_json"])
+        if options.get("prometheus_textfile"):
+            RunMetrics.write_prometheus(summary, options["prometheus_textfile"])
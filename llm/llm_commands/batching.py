@@ -0,0 +1,45 @@
+def iter_by_pk(queryset, chunk_size=500):
+    """
+    Stream a queryset in primary-key order, one keyset-paginated query per chunk.
+
+    Each chunk is fetched with `pk > last_pk LIMIT chunk_size`, so only one
+    chunk of rows is held in memory at a time and every query stays an index
+    range scan no matter how far into the table the iteration is.
+    """
+    queryset = queryset.order_by("pk")
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1].pk
+
+
+class BatchBuffer:
+    """
+    Collect results and hand them to `flush_batch` in lists of `batch_size`.
+
+    Lets the commands write results with bulk queries in one transaction per
+    batch instead of one round-trip per hotel. Call `flush` once more at the
+    end of a run to write the remainder.
+    """
+
+    def __init__(self, flush_batch, batch_size=100):
+        self.flush_batch = flush_batch
+        self.batch_size = max(1, batch_size)
+        self.items = []
+        self.flushed = 0
+
+    def add(self, item):
+        self.items.append(item)
+        if len(self.items) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.items:
+            return
+        items, self.items = self.items, []
+        self.flush_batch(items)
+        self.flushed += len(items)
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+
+class ResponseCache:
+    """
+    Persistent cache of Gemini API responses, shared by the LLM commands.
+
+    Entries are keyed by a hash of the model, prompt and generationConfig, so
+    re-running a command only calls the API for prompts it hasn't seen.
+    Responses are stored in a local SQLite file; entries older than `ttl`
+    seconds are ignored. Once the cache holds more than `max_entries`, the
+    least recently used entries are evicted down to `low_water` of the limit,
+    so eviction runs once per batch of inserts rather than on every one.
+    """
+
+    low_water = 0.9
+
+    def __init__(self, path, ttl=None, max_entries=None):
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._connection = None
+        self._size = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            settings.LLM_CACHE_PATH,
+            ttl=settings.LLM_CACHE_TTL,
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+        )
+
+    @staticmethod
+    def make_key(model, prompt, generation_config):
+        """Hash everything that influences the response into a cache key."""
+        material = json.dumps(
+            {"model": model, "prompt": prompt, "generationConfig": generation_config},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    @property
+    def connection(self):
+        # Opened lazily so that constructing a command never touches the disk.
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+            self._connection.commit()
+            self._size = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return self._connection
+
+    def get(self, key):
+        """Return the cached response for `key`, or None on a miss."""
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self.connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, response):
+        """Store a response and evict old entries if the cache is over its limits."""
+        now = time.time()
+        data = json.dumps(response)
+        with self.lock:
+            cursor = self.connection.execute(
+                """
+                INSERT INTO responses (key, response, created_at, accessed_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO NOTHING
+                """,
+                (key, data, now, now),
+            )
+            if cursor.rowcount:
+                self._size += 1
+            else:
+                self.connection.execute(
+                    "UPDATE responses SET response = ?, created_at = ?, accessed_at = ? WHERE key = ?",
+                    (data, now, now, key),
+                )
+            if self.max_entries and self._size > self.max_entries:
+                self._evict(now)
+            self.connection.commit()
+
+    def _evict(self, now):
+        if self.ttl:
+            cursor = self.connection.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+            )
+            self._size -= cursor.rowcount
+        target = math.ceil(self.max_entries * self.low_water)
+        if self._size > target:
+            cursor = self.connection.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (target,),
+            )
+            self._size -= cursor.rowcount
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
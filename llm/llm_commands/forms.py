@@ -0,0 +1,20 @@
+from django import forms
+from .models import Hotel
+
+
+class HotelForm(forms.ModelForm):
+    class Meta:
+        model = Hotel
+        fields = [
+            "property_title",
+            "description",
+            "city_name",
+            "hotel_id",
+            "price",
+            "rating",
+            "address",
+            "latitude",
+            "longitude",
+            "room_type",
+            "image",
+        ]
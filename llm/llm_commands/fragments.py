@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from django.db import transaction
+
+
+# Columns the scraper refreshes on every re-crawl. It upserts them from
+# another process without going through Django, so it can't drop fragments;
+# instead each fragment is cached with the values it was rendered from and
+# re-rendered once they change.
+SCRAPED_FIELDS = ("city_name", "address", "price", "rating", "room_type")
+
+
+def hotel_fragment_key(pk):
+    """Cache key of a hotel's rendered detail fragment."""
+    return f"hotel:{pk}:detail"
+
+
+def invalidate_hotels(pks):
+    """
+    Drop the cached fragments of the given hotels once the current transaction commits.
+
+    Deleting before the commit would let a concurrent request cache the old
+    rows again; outside a transaction the fragments are dropped immediately.
+    """
+    keys = [hotel_fragment_key(pk) for pk in pks]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def scraped_values(hotel):
+    """The hotel's current SCRAPED_FIELDS, stored next to its rendered fragment."""
+    return tuple(getattr(hotel, field) for field in SCRAPED_FIELDS)
+
+
+def fresh_fragment(entry, scraped):
+    """
+    Return the fragment of a cached `(scraped_values, fragment)` entry, or None
+    if nothing is cached or the scraper has changed the hotel since it was rendered.
+    """
+    if isinstance(entry, tuple) and entry[0] == tuple(scraped):
+        return entry[1]
+    return None
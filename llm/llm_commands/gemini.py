@@ -0,0 +1,250 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_commands.cache import ResponseCache
+from llm_commands.packing import estimate_tokens
+
+
+class LatencyHistogram:
+    """
+    Thread-safe histogram of request latencies in seconds.
+
+    Observations are counted into fixed buckets, so memory stays constant
+    however many requests are made; percentiles are reported as the upper
+    bound of the bucket they fall into.
+    """
+
+    buckets = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+    def __init__(self):
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+
+    def percentile(self, q):
+        """Return the bucket upper bound below which `q` (0-1) of observations fall."""
+        with self.lock:
+            if not self.count:
+                return None
+            threshold = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= threshold:
+                    return bound
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip(self.buckets, self.counts)),
+        }
+
+
+class GeminiClient:
+    """
+    Shared HTTP client for the Gemini generateContent endpoint.
+
+    Requests go through one pooled `requests.Session`, so connections are
+    kept alive between calls. 429 and 5xx responses and connection errors
+    are retried with exponential backoff and full jitter, honouring
+    Retry-After when the server sends it. An optional rate limiter and
+    response cache are consulted around every call. Latencies are recorded
+    in `latency` and token usage in `tokens_in`/`tokens_out`; raw responses
+    are only logged when `log_payloads` is set.
+    """
+
+    base_url = "https://generativelanguage.googleapis.com/v1/models"
+    retry_status_codes = (429, 500, 502, 503, 504)
+    throttle_status_codes = (429, 503)
+    default_generation_config = {
+        "temperature": 0.7,
+        "topK": 40,
+        "topP": 0.95,
+        "maxOutputTokens": 1024,
+    }
+
+    def __init__(self, api_key, model="gemini-pro", base_url=None, timeout=30, max_retries=3,
+                 backoff_base=1.0, backoff_max=60.0, pool_size=10, rate_limiter=None, cache=None,
+                 log_payloads=False):
+        self.api_key = api_key
+        self.model = model
+        if base_url:
+            self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.log_payloads = log_payloads
+        self.latency = LatencyHistogram()
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.usage_lock = threading.Lock()
+        self.session = requests.Session()
+        self.session.headers["Content-Type"] = "application/json"
+        self.configure_pool(pool_size)
+
+    @property
+    def url(self):
+        return f"{self.base_url}/{self.model}:generateContent"
+
+    def configure_pool(self, size):
+        """Keep up to `size` connections alive, e.g. one per concurrent worker."""
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def backoff_delay(self, attempt):
+        """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def retry_after(self, response):
+        """
+        Return the Retry-After delay in seconds, or None if absent or unparseable.
+
+        Capped at `backoff_max`, so a long or far-future Retry-After doesn't
+        hold a pool worker for an hour.
+        """
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(0.0, seconds), self.backoff_max)
+
+    def build_payload(self, prompt, generation_config):
+        return {
+            "contents": [{
+                "parts": [{
+                    "text": prompt
+                }]
+            }],
+            "generationConfig": generation_config,
+        }
+
+    def request_params(self):
+        return {"key": self.api_key}
+
+    def parse_response(self, result):
+        """Return the response in the generateContent shape the commands read."""
+        return result
+
+    def generate(self, prompt, generation_config=None):
+        """Generate a response for `prompt`; returns the decoded response, or None on failure."""
+        generation_config = generation_config or self.default_generation_config
+        cache_key = ResponseCache.make_key(self.model, prompt, generation_config)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        result = self.request(prompt, generation_config)
+        if result is None:
+            return None
+        self.record_usage(prompt, result)
+        if self.rate_limiter is not None:
+            self.rate_limiter.succeeded()
+        if self.cache is not None and result.get("candidates"):
+            self.cache.set(cache_key, result)
+        return result
+
+    def record_usage(self, prompt, result):
+        """Add the request's token counts, estimating them if the API didn't report usage."""
+        usage = result.get("usageMetadata") or {}
+        tokens_in = usage.get("promptTokenCount")
+        tokens_out = usage.get("candidatesTokenCount")
+        if tokens_in is None:
+            tokens_in = estimate_tokens(prompt)
+        if tokens_out is None:
+            tokens_out = sum(
+                estimate_tokens(part.get("text"))
+                for candidate in result.get("candidates", [])
+                for part in candidate.get("content", {}).get("parts", [])
+            )
+        with self.usage_lock:
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+
+    def request(self, prompt, generation_config):
+        """POST one prompt, retrying throttled and failed requests; returns None on failure."""
+        payload = self.build_payload(prompt, generation_config)
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            started = time.perf_counter()
+            try:
+                response = self.session.post(
+                    self.url,
+                    params=self.request_params(),
+                    json=payload,
+                    timeout=self.timeout,
+                )
+            except requests.exceptions.RequestException as e:
+                self.latency.observe(time.perf_counter() - started)
+                logging.error(f"API request failed (attempt {attempt + 1}/{self.max_retries + 1}): {str(e)}")
+                if last_attempt:
+                    return None
+                time.sleep(self.backoff_delay(attempt))
+                continue
+            self.latency.observe(time.perf_counter() - started)
+
+            if self.log_payloads:
+                logging.info(f"Raw API Response: {response.text}")
+
+            if response.status_code in self.retry_status_codes:
+                retry_after = self.retry_after(response)
+                if self.rate_limiter is not None and response.status_code in self.throttle_status_codes:
+                    # Holds back the other workers for the pause the server asked for too.
+                    self.rate_limiter.throttled(retry_after)
+                logging.warning(
+                    f"API Error: {response.status_code}, attempt {attempt + 1}/{self.max_retries + 1}"
+                )
+                if last_attempt:
+                    logging.error(f"API Error: {response.status_code} - {response.text}")
+                    return None
+                time.sleep(retry_after if retry_after is not None else self.backoff_delay(attempt))
+                continue
+
+            if response.status_code != 200:
+                logging.error(f"API Error: {response.status_code} - {response.text}")
+                return None
+
+            try:
+                return self.parse_response(response.json())
+            except (LookupError, TypeError, ValueError) as e:
+                logging.error(f"API returned an invalid response: {str(e)}")
+                return None
+
+        return None
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -1,67 +1,28 @@
 import os
-import requests
-import time
+import json
 import re
 import logging
-from django.core.management.base import BaseCommand
-from llm_commands.models import Hotel, Summary, PropertyRating
-from decouple import config
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("generate_summaries_and_ratings.log"),
-    ],
-)
-
-class Command(BaseCommand):
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.db import transaction
+from llm_commands.models import Summary, PropertyRating
+from llm_commands.base import LLMCommand
+from llm_commands.fragments import invalidate_hotels
+from llm_commands.search import update_search_index
+
+class Command(LLMCommand):
     help = "Generate summaries, ratings, and reviews for hotels using the Gemini API"
 
-    def __init__(self):
-        super().__init__()
-        self.api_key = config("GEMINI_API_KEY")
-        self.api_url = "https://generativelanguage.googleapis.com/v1/models/gemini-pro:generateContent"
-
-    def call_gemini_api(self, prompt):
-        """Call the Gemini API with proper error handling."""
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "contents": [{
-                "parts": [{
-                    "text": prompt
-                }]
-            }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 1024,
-            }
-        }
+    task_name = "generate_summaries_and_ratings"
+    default_concurrency = 1
+    default_rate = 0.5  # requests per second
 
-        try:
-            response = requests.post(
-                f"{self.api_url}?key={self.api_key}",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-
-            if response.status_code != 200:
-                logging.error(f"API Error: {response.status_code} - {response.text}")
-                return None
-
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"API request failed: {str(e)}")
-            return None
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--separate",
+            action="store_true",
+            help="Use separate summary and rating requests instead of one combined JSON request per hotel",
+        )
 
     def generate_summary_prompt(self, hotel):
         """Create a prompt for generating hotel summaries."""
@@ -103,56 +64,154 @@ class Command(BaseCommand):
             logging.error(f"Error parsing rating/review: {str(e)}")
             return None, None
 
+    def generate_combined_prompt(self, hotel):
+        """Create a single prompt that asks for the summary, rating and review as JSON."""
+        return f"""
+        Based on the following hotel information, write a summary, a rating and a review.
+
+        Title: {hotel.property_title}
+        Description: {hotel.description}
+
+        Respond with a single JSON object and nothing else, using exactly this schema:
+        {{"summary": "<professional summary, at most 150 words>", "rating": <number from 0 to 5>, "review": "<review text>"}}
+        """
+
+    def parse_combined_response(self, text):
+        """Parse summary, rating and review from a JSON response."""
+        try:
+            # Tolerate Markdown code fences or stray text around the object.
+            start = text.index("{")
+            data, _ = json.JSONDecoder().raw_decode(text[start:])
+
+            summary = str(data.get("summary") or "").strip()
+            review = str(data.get("review") or "").strip()
+            rating = float(data["rating"])
+            if not summary or not review:
+                raise ValueError("Missing summary or review")
+            if not 0 <= rating <= 5:
+                raise ValueError(f"Rating out of range: {rating}")
+            return summary, rating, review
+        except Exception as e:
+            logging.error(f"Error parsing combined response: {str(e)}")
+            return None, None, None
+
+    def extract_text(self, api_response):
+        """Return the generated text of an API response, or an empty string."""
+        if not api_response:
+            return ""
+        return api_response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+
+    def generate_combined(self, hotel):
+        """Generate summary, rating and review with one API call."""
+        with self.metrics.time("prompt_build"):
+            prompt = self.generate_combined_prompt(hotel)
+        text = self.extract_text(self.call_gemini_api(prompt))
+        if not text:
+            return None, None, None
+        with self.metrics.time("parse"):
+            return self.parse_combined_response(text)
+
+    def generate_separately(self, hotel):
+        """Generate the summary and the rating/review with two API calls."""
+        with self.metrics.time("prompt_build"):
+            summary_prompt = self.generate_summary_prompt(hotel)
+            rating_prompt = self.generate_rating_prompt(hotel)
+        summary_text = self.extract_text(self.call_gemini_api(summary_prompt))
+
+        rating, review = None, None
+        rating_text = self.extract_text(self.call_gemini_api(rating_prompt))
+        if rating_text:
+            with self.metrics.time("parse"):
+                rating, review = self.parse_rating_review(rating_text)
+        return summary_text or None, rating, review
+
+    def save_result(self, hotel, future):
+        """Queue a finished hotel for writing. Returns True if it produced a full result."""
+        input_hash = self.hotel_hash(hotel)
+        try:
+            summary_text, rating, review = future.result()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error processing hotel {hotel.id}: {str(e)}"))
+            logging.error(f"Error processing hotel {hotel.id}: {str(e)}")
+            self.failures.add((hotel, input_hash, e))
+            return False
+
+        if summary_text and rating is not None and review:
+            self.writer.add((hotel, input_hash, summary_text, rating, review))
+            self.stdout.write(self.style.SUCCESS(f"Generated summary, rating and review for hotel {hotel.id}"))
+            return True
+
+        self.failures.add((hotel, input_hash, "Invalid content"))
+        self.stdout.write(self.style.WARNING(f"Failed to generate summary and rating for hotel {hotel.id}"))
+        return False
+
+    def write_batch(self, results):
+        """
+        Save new current summaries and ratings for a batch of hotels in one transaction.
+
+        `results` holds `(hotel, input_hash, summary, rating, review)` tuples.
+        Previous results are kept as history but no longer current.
+        """
+        hotel_ids = [hotel.id for hotel, *_ in results]
+        with self.metrics.time("db_write"), transaction.atomic():
+            Summary.objects.filter(property_id__in=hotel_ids, is_current=True).update(is_current=False)
+            PropertyRating.objects.filter(property_id__in=hotel_ids, is_current=True).update(is_current=False)
+            Summary.objects.bulk_create(
+                Summary(property=hotel, summary=summary)
+                for hotel, _, summary, _, _ in results
+            )
+            PropertyRating.objects.bulk_create(
+                PropertyRating(property=hotel, rating=rating, review=review)
+                for hotel, _, _, rating, review in results
+            )
+            self.work_state.mark_done((hotel, input_hash) for hotel, input_hash, *_ in results)
+            update_search_index(hotel_ids)
+            invalidate_hotels(hotel_ids)
+
     def handle(self, *args, **options):
         """Main command handler."""
-        hotels = Hotel.objects.all()
-        total = hotels.count()
+        self.setup(options)
+        generate = self.generate_separately if options.get("separate") else self.generate_combined
         updated_summaries = 0
         updated_ratings = 0
-
-        self.stdout.write(f"Starting to process {total} hotels...")
-
-        for hotel in hotels:
-            if not hotel.property_title or not hotel.description:
-                self.stdout.write(f"Skipping hotel {hotel.id}: Missing title or description")
-                continue
-
-            try:
-                # Generate summary
-                summary_prompt = self.generate_summary_prompt(hotel)
-                summary_response = self.call_gemini_api(summary_prompt)
-
-                if summary_response:
-                    summary_text = summary_response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-                    if summary_text:
-                        Summary.objects.create(property=hotel, summary=summary_text)
-                        updated_summaries += 1
-                        self.stdout.write(self.style.SUCCESS(f"Generated summary for hotel {hotel.id}"))
-
-                # Generate rating and review
-                rating_prompt = self.generate_rating_prompt(hotel)
-                rating_response = self.call_gemini_api(rating_prompt)
-
-                if rating_response:
-                    rating_text = rating_response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-                    if rating_text:
-                        rating, review = self.parse_rating_review(rating_text)
-                        if rating is not None and review:
-                            PropertyRating.objects.create(property=hotel, rating=rating, review=review)
-                            updated_ratings += 1
-                            self.stdout.write(self.style.SUCCESS(f"Generated rating and review for hotel {hotel.id}"))
-
-                # Add delay between API calls
-                time.sleep(2)
-
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Error processing hotel {hotel.id}: {str(e)}"))
-                logging.error(f"Error processing hotel {hotel.id}: {str(e)}")
-                continue
+        processed = 0
+
+        self.stdout.write("Starting to process hotels...")
+
+        def collect(done):
+            nonlocal updated_summaries, updated_ratings, processed
+            for future in done:
+                hotel = in_flight.pop(future)
+                processed += 1
+                if self.save_result(hotel, future):
+                    updated_summaries += 1
+                    updated_ratings += 1
+
+        # API calls run on worker threads; results are saved on this thread
+        # as they complete, with at most a couple of rounds of hotels queued.
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for hotel in self.pending_hotels():
+                if not hotel.property_title or not hotel.description:
+                    self.stdout.write(f"Skipping hotel {hotel.id}: Missing title or description")
+                    continue
+
+                in_flight[executor.submit(generate, hotel)] = hotel
+                if len(in_flight) >= self.concurrency * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        self.finish(processed)
 
         # Final statistics
         self.stdout.write(
             self.style.SUCCESS(
-                f"Completed processing hotels:\n - Summaries generated: {updated_summaries}\n - Ratings generated: {updated_ratings}"
+                f"Completed processing {self.work_state.seen} hotels:\n - Summaries generated: {updated_summaries}\n - Ratings generated: {updated_ratings}"
+                f"\n - Unchanged since last run: {self.work_state.skipped}"
             )
         )
+        self.report(options)
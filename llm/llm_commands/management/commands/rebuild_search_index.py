@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from llm_commands.models import Hotel
+from llm_commands.batching import iter_by_pk
+from llm_commands.search import UPDATE_CHUNK_SIZE, update_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search index for every hotel, e.g. after "
+        "summaries or reviews were written outside the LLM commands and views."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=UPDATE_CHUNK_SIZE,
+            help=f"Hotels updated per transaction (default {UPDATE_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options.get("chunk_size") or UPDATE_CHUNK_SIZE)
+        ids = []
+        total = 0
+        for hotel in iter_by_pk(Hotel.objects.only("pk"), chunk_size):
+            ids.append(hotel.pk)
+            if len(ids) >= chunk_size:
+                total += self.update(ids)
+                ids = []
+        total += self.update(ids)
+        self.stdout.write(f"Reindexed {total} hotels")
+
+    def update(self, ids):
+        if not ids:
+            return 0
+        with transaction.atomic():
+            update_search_index(ids)
+        return len(ids)
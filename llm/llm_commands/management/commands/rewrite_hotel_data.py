@@ -2,72 +2,45 @@
 
 import os
 import re
-import requests
-import time
+import json
 import logging
-from django.core.management.base import BaseCommand
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.db import transaction
 from llm_commands.models import Hotel  # Replace with your actual app name
-from decouple import config
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Changed to DEBUG for more detailed logging
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("rewrite_hotel.log"),
-    ],
-)
-
-class Command(BaseCommand):
+from llm_commands.base import LLMCommand
+from llm_commands.packing import PromptPacker, estimate_tokens
+from llm_commands.fragments import invalidate_hotels
+from llm_commands.search import update_search_index
+
+class Command(LLMCommand):
     help = "Rewrite hotel property titles and descriptions using the Gemini API"
 
-    def __init__(self):
-        super().__init__()
-        self.api_key = config('GEMINI_API_KEY')
-        self.api_url = "https://generativelanguage.googleapis.com/v1/models/gemini-pro:generateContent"
+    task_name = "rewrite_hotel_data"
+    default_concurrency = 4
+    default_rate = 1.0  # requests per second
+    default_pack_size = 1  # hotels per prompt; 1 disables packing
+    default_pack_output_tokens = 8192
+    pack_retries = 2
+    # Expected output per packed hotel: a short title, a description of a
+    # couple of hundred words, and the JSON keys around them.
+    title_tokens = 20
+    description_tokens = 400
+    pack_overhead_tokens = 25
 
-    def call_gemini_api(self, prompt):
-        """Call the Gemini API with proper error handling."""
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "contents": [{
-                "parts": [{
-                    "text": prompt
-                }]
-            }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 1024,
-            }
-        }
-
-        try:
-            response = requests.post(
-                f"{self.api_url}?key={self.api_key}",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            
-            # Log the raw response for debugging
-            logging.debug(f"Raw API Response: {response.text}")
-            
-            if response.status_code == 400:
-                logging.error(f"Bad Request Error: {response.text}")
-                return None
-                
-            response.raise_for_status()
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            logging.error(f"API request failed: {str(e)}")
-            return None
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--pack-size",
+            type=int,
+            default=self.default_pack_size,
+            help="Maximum hotels rewritten per prompt; fewer are packed if their output would not fit",
+        )
+        parser.add_argument(
+            "--max-output-tokens",
+            type=int,
+            default=self.default_pack_output_tokens,
+            help="maxOutputTokens for packed prompts; packs are sized to stay under it",
+        )
 
     def create_prompt(self, hotel):
         """Create a prompt for the API, handling missing data."""
@@ -98,9 +71,6 @@ class Command(BaseCommand):
             return None, None
             
         try:
-            # Log the response structure for debugging
-            logging.debug(f"Parsing API response: {api_response}")
-            
             # Get the generated text from the response
             if "candidates" in api_response:
                 text = api_response["candidates"][0]["content"]["parts"][0]["text"]
@@ -108,9 +78,6 @@ class Command(BaseCommand):
                 logging.error("Unexpected API response structure")
                 return None, None
             
-            # Log the extracted text
-            logging.debug(f"Extracted text from response: {text}")
-            
             title = None
             description = None
             
@@ -130,10 +97,10 @@ class Command(BaseCommand):
                     # Append additional description lines
                     description = f"{description} {line.strip()}"
             
-            # Log the extracted content
-            logging.debug(f"Extracted title: {title}")
-            logging.debug(f"Extracted description: {description}")
-            
+            if self.log_payloads:
+                logging.info(f"Extracted title: {title}")
+                logging.info(f"Extracted description: {description}")
+
             if not title or not description:
                 logging.error("Failed to extract title or description")
                 return None, None
@@ -144,90 +111,258 @@ class Command(BaseCommand):
             logging.error(f"Error parsing API response: {str(e)}")
             return None, None
 
+    def create_packed_prompt(self, hotels):
+        """Create one prompt that rewrites several hotels as a JSON array."""
+        entries = "\n\n".join(
+            f"""
+        Hotel ID: {hotel.id}
+        Current Title: {hotel.property_title or "Untitled Property"}
+        Current Description: {hotel.description or "No description available"}"""
+            for hotel in hotels
+        )
+        return f"""
+        As a luxury hotel marketing expert, rewrite the following hotel information to be more appealing and professional.
+        {entries}
+
+        Requirements:
+        1. Respond with ONLY a JSON array containing one object per hotel, in this format:
+        [{{"hotel_id": <hotel id>, "title": "<new title>", "description": "<new description>"}}]
+        2. Use the Hotel ID given above for each hotel and include every hotel exactly once.
+
+        Each title should be eye-catching and memorable (max 50 characters).
+        Each description should be detailed, engaging, and at least 200 words.
+        Do not include any other text or explanations in your response.
+        """
+
+    def extract_packed_content(self, api_response, hotels):
+        """
+        Split a packed response into `{hotel_id: (title, description)}`.
+
+        Entries with an unknown or repeated hotel_id, or without a title and
+        description, are left out so the caller can retry those hotels.
+        """
+        if not api_response or "candidates" not in api_response:
+            logging.error("Unexpected API response structure")
+            return {}
+
+        try:
+            text = api_response["candidates"][0]["content"]["parts"][0]["text"]
+            # Tolerate Markdown code fences or stray text around the array.
+            data, _ = json.JSONDecoder().raw_decode(text[text.index("["):])
+        except (LookupError, TypeError, ValueError) as e:
+            logging.error(f"Error parsing packed API response: {str(e)}")
+            return {}
+        if not isinstance(data, list):
+            logging.error("Packed API response is not a JSON array")
+            return {}
+
+        expected = {hotel.id for hotel in hotels}
+        results = {}
+        for entry in data:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                hotel_id = int(entry.get("hotel_id"))
+            except (TypeError, ValueError):
+                continue
+            title = str(entry.get("title") or "").strip()
+            description = str(entry.get("description") or "").strip()
+            if hotel_id in expected and hotel_id not in results and title and description:
+                results[hotel_id] = (title, description)
+        return results
+
+    def estimate_output_tokens(self, hotel):
+        """Expected output tokens for one hotel in a packed response."""
+        return (
+            self.title_tokens
+            + max(self.description_tokens, estimate_tokens(hotel.description))
+            + self.pack_overhead_tokens
+        )
+
+    def rewrite_pack(self, hotels):
+        """
+        Rewrite several hotels with one prompt; returns `{hotel_id: (title, description)}`.
+
+        Hotels missing from the response or with invalid entries are sent
+        again in a smaller pack, up to `pack_retries` times. Hotels that still
+        have no result are left out of the returned dict.
+        """
+        generation_config = dict(
+            self.client.default_generation_config, maxOutputTokens=self.max_output_tokens
+        )
+        results = {}
+        pending = list(hotels)
+        for _ in range(self.pack_retries + 1):
+            with self.metrics.time("prompt_build"):
+                prompt = self.create_packed_prompt(pending)
+            api_response = self.call_gemini_api(prompt, generation_config)
+            if not api_response:
+                break
+            with self.metrics.time("parse"):
+                results.update(self.extract_packed_content(api_response, pending))
+            pending = [hotel for hotel in pending if hotel.id not in results]
+            if not pending:
+                break
+            logging.warning(f"Retrying {len(pending)} hotels missing from a packed response")
+        return results
+
+    def rewrite_single(self, hotels):
+        """Rewrite a one-hotel batch with the plain-text prompt."""
+        hotel = hotels[0]
+        return {hotel.id: self.rewrite_hotel(hotel)}
+
+    def rewrite_hotel(self, hotel):
+        """
+        Generate a new title and description for one hotel.
+
+        Runs on a worker thread, so it only talks to the API; the database
+        write happens back on the main thread in `save_result`.
+        Returns None when the API gave no usable response.
+        """
+        with self.metrics.time("prompt_build"):
+            prompt = self.create_prompt(hotel)
+        api_response = self.call_gemini_api(prompt)
+        if not api_response:
+            return None
+        with self.metrics.time("parse"):
+            return self.extract_content(api_response)
+
+    def save_result(self, hotel, result, completed, error=None):
+        """Apply a finished rewrite to the hotel. Returns True if the hotel was updated."""
+        input_hash = self.hotel_hash(hotel)
+        if error is not None:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Error processing hotel {hotel.id}: {str(error)}"
+                )
+            )
+            logging.error(f"Error processing hotel {hotel.id}: {str(error)}")
+            self.failures.add((hotel, input_hash, error))
+            return False
+
+        if result is None:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Failed to update hotel {hotel.id} ({completed} done): API error"
+                )
+            )
+            self.failures.add((hotel, input_hash, "API error"))
+            return False
+
+        new_title, new_description = result
+        if not new_title or not new_description:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Failed to update hotel {hotel.id} ({completed} done): Invalid content"
+                )
+            )
+            self.failures.add((hotel, input_hash, "Invalid content"))
+            return False
+
+        # Store original values for logging
+        original_title = hotel.property_title
+
+        # Update hotel; the row is written with the next batch
+        hotel.property_title = new_title
+        hotel.description = new_description
+        self.writer.add(hotel)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated hotel {hotel.id} ({completed} done)"
+            )
+        )
+
+        # Log the changes
+        logging.info(f"Hotel {hotel.id} updated:")
+        logging.info(f"Original title: {original_title}")
+        logging.info(f"New title: {new_title}")
+        return True
+
+    def write_batch(self, hotels):
+        """Save a batch of rewritten hotels and mark them done in one transaction."""
+        with self.metrics.time("db_write"), transaction.atomic():
+            Hotel.objects.bulk_update(hotels, fields=["property_title", "description"])
+            # The next run compares against the rewritten content, so a hotel
+            # is only rewritten again if someone edits it.
+            self.work_state.mark_done((hotel, self.hotel_hash(hotel)) for hotel in hotels)
+            update_search_index(hotel.pk for hotel in hotels)
+            invalidate_hotels(hotel.pk for hotel in hotels)
+
     def handle(self, *args, **options):
         """Main command handler."""
-        hotels = Hotel.objects.all()
-        total = hotels.count()
-        processed = 0
+        self.setup(options)
+        pack_size = max(1, options.get("pack_size") or self.default_pack_size)
+        self.max_output_tokens = options.get("max_output_tokens") or self.default_pack_output_tokens
+
         skipped = 0
         updated = 0
-        
-        self.stdout.write(f"Starting to process {total} hotels...")
-        
-        for hotel in hotels:
-            processed += 1
-            
-            # Skip hotels with no data
-            if not hotel.property_title and not hotel.description:
-                self.stdout.write(f"Skipping hotel {hotel.id}: Missing title and description")
-                skipped += 1
-                continue
-                
-            try:
-                # Create prompt and call API
-                prompt = self.create_prompt(hotel)
-                api_response = self.call_gemini_api(prompt)
-                
-                if api_response:
-                    new_title, new_description = self.extract_content(api_response)
-                    
-                    if new_title and new_description:
-                        # Store original values for logging
-                        original_title = hotel.property_title
-                        original_description = hotel.description
-                        
-                        # Update hotel
-                        hotel.property_title = new_title
-                        hotel.description = new_description
-                        hotel.save()
-                        
+        completed = 0
+
+        self.stdout.write(f"Starting to process hotels with {self.concurrency} concurrent requests...")
+
+        def collect(done):
+            nonlocal completed, updated, skipped
+            for future in done:
+                hotels = in_flight.pop(future)
+                try:
+                    results, error = future.result(), None
+                except Exception as e:
+                    results, error = {}, e
+                for hotel in hotels:
+                    completed += 1
+                    if self.save_result(hotel, results.get(hotel.id), completed, error):
                         updated += 1
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f"Updated hotel {hotel.id} ({processed}/{total})"
-                            )
-                        )
-                        
-                        # Log the changes
-                        logging.info(f"Hotel {hotel.id} updated:")
-                        logging.info(f"Original title: {original_title}")
-                        logging.info(f"New title: {new_title}")
                     else:
-                        self.stdout.write(
-                            self.style.WARNING(
-                                f"Failed to update hotel {hotel.id} ({processed}/{total}): Invalid content"
-                            )
-                        )
                         skipped += 1
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"Failed to update hotel {hotel.id} ({processed}/{total}): API error"
-                        )
-                    )
+
+        def rewritable(hotels):
+            nonlocal completed, skipped
+            for hotel in hotels:
+                # Skip hotels with no data
+                if not hotel.property_title and not hotel.description:
+                    self.stdout.write(f"Skipping hotel {hotel.id}: Missing title and description")
+                    completed += 1
                     skipped += 1
-                
-                # Add delay between API calls
-                time.sleep(2)
-                
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f"Error processing hotel {hotel.id}: {str(e)}"
-                    )
-                )
-                logging.error(f"Error processing hotel {hotel.id}: {str(e)}")
-                skipped += 1
-                continue
-        
+                    continue
+                yield hotel
+
+        hotels = rewritable(self.pending_hotels())
+        if pack_size > 1:
+            packer = PromptPacker(self.max_output_tokens, pack_size)
+            batches = packer.pack(hotels, self.estimate_output_tokens)
+            rewrite = self.rewrite_pack
+        else:
+            batches = ([hotel] for hotel in hotels)
+            rewrite = self.rewrite_single
+
+        # Results are collected as they complete and written in batches; at
+        # most a couple of rounds of prompts are queued at once so memory
+        # doesn't grow with the catalogue.
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for batch in batches:
+                in_flight[executor.submit(rewrite, batch)] = batch
+                if len(in_flight) >= self.concurrency * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        self.finish(completed)
+
         # Print final statistics
         self.stdout.write(
             self.style.SUCCESS(
                 f"""
                 Processing completed:
-                - Total hotels: {total}
+                - Total hotels: {self.work_state.seen}
                 - Successfully updated: {updated}
                 - Skipped: {skipped}
+                - Unchanged since last run: {self.work_state.skipped}
                 """
             )
-        )
\ No newline at end of file
+        )
+        self.report(options)
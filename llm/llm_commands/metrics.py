@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RunMetrics:
+    """
+    Per-stage timings and throughput of one management command run.
+
+    Stages are timed with `time(stage)` or, for lazily evaluated database
+    iterators, `timed_iter(stage, iterable)`. `summary` combines them with
+    the API latency percentiles and token counts recorded by the LLM client,
+    and the result can be saved as JSON or as a Prometheus textfile for the
+    node_exporter textfile collector.
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.stages = {}
+        self.hotels = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            count, total = self.stages.get(stage, (0, 0.0))
+            self.stages[stage] = (count + 1, total + seconds)
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def timed_iter(self, stage, iterable):
+        """Yield from `iterable`, timing each step (e.g. the query behind every chunk)."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - started)
+                return
+            self.add(stage, time.perf_counter() - started)
+            yield item
+
+    def summary(self, client):
+        elapsed = time.perf_counter() - self.started
+        latency = client.latency.snapshot()
+        with self.lock:
+            stages = {
+                stage: {"count": count, "seconds": round(total, 6), "mean_ms": round(total / count * 1000, 3)}
+                for stage, (count, total) in self.stages.items()
+            }
+        return {
+            "command": self.command,
+            "elapsed_seconds": round(elapsed, 3),
+            "hotels": self.hotels,
+            "hotels_per_minute": round(self.hotels / elapsed * 60, 2) if elapsed else 0.0,
+            "stages": stages,
+            "api": {key: latency[key] for key in ("count", "mean", "p50", "p95", "p99")},
+            "tokens": {"in": client.tokens_in, "out": client.tokens_out},
+            "cache": client.cache.stats() if client.cache is not None else None,
+        }
+
+    @staticmethod
+    def write_json(summary, path):
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    @staticmethod
+    def prometheus_lines(summary):
+        labels = f'command="{summary["command"]}"'
+        lines = [
+            "# HELP llm_command_duration_seconds Wall time of the last run.",
+            "# TYPE llm_command_duration_seconds gauge",
+            f"llm_command_duration_seconds{{{labels}}} {summary['elapsed_seconds']}",
+            "# HELP llm_command_hotels Hotels processed by the last run.",
+            "# TYPE llm_command_hotels gauge",
+            f"llm_command_hotels{{{labels}}} {summary['hotels']}",
+            "# HELP llm_command_hotels_per_minute Throughput of the last run.",
+            "# TYPE llm_command_hotels_per_minute gauge",
+            f"llm_command_hotels_per_minute{{{labels}}} {summary['hotels_per_minute']}",
+            "# HELP llm_command_stage_seconds Time spent per stage in the last run.",
+            "# TYPE llm_command_stage_seconds gauge",
+        ]
+        lines += [
+            f'llm_command_stage_seconds{{{labels},stage="{stage}"}} {stats["seconds"]}'
+            for stage, stats in summary["stages"].items()
+        ]
+        lines += [
+            "# HELP llm_command_api_latency_seconds API latency percentiles (bucket upper bounds).",
+            "# TYPE llm_command_api_latency_seconds gauge",
+        ]
+        lines += [
+            f'llm_command_api_latency_seconds{{{labels},quantile="{quantile}"}} {summary["api"][key]}'
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99"))
+            if summary["api"][key] is not None
+        ]
+        lines += [
+            "# HELP llm_command_tokens Tokens sent to and received from the LLM in the last run.",
+            "# TYPE llm_command_tokens gauge",
+            f'llm_command_tokens{{{labels},direction="in"}} {summary["tokens"]["in"]}',
+            f'llm_command_tokens{{{labels},direction="out"}} {summary["tokens"]["out"]}',
+        ]
+        return lines
+
+    @classmethod
+    def write_prometheus(cls, summary, path):
+        # Written to a temporary file and renamed, so the collector never
+        # reads a half-written file.
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(cls.prometheus_lines(summary)) + "\n")
+        os.replace(tmp_path, path)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm_commands', '0003_alter_hotel_property_title'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=64)),
+                ('input_hash', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('done', 'Done'), ('failed', 'Failed')], max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('last_processed_at', models.DateTimeField(auto_now=True)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processing_states', to='llm_commands.hotel')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hotel', 'task'), name='unique_processing_state_per_task')],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:37
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Max
+
+import llm_commands.operations
+
+
+def keep_latest_result_current(apps, schema_editor):
+    """Leave only the newest summary and rating of each hotel current."""
+    for model_name in ("Summary", "PropertyRating"):
+        model = apps.get_model("llm_commands", model_name)
+        latest = model.objects.values("property").annotate(latest_id=Max("id")).values("latest_id")
+        model.objects.exclude(id__in=latest).update(is_current=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm_commands', '0004_processingstate'),
+    ]
+
+    operations = [
+        llm_commands.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name='propertyrating',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='propertyrating',
+            name='is_current',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='summary',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='summary',
+            name='is_current',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['city_name'], name='hotels_city_name_idx'),
+        ),
+        # Trigram indexes for the admin's icontains search, which Postgres
+        # runs as UPPER(column::text) LIKE UPPER('%term%').
+        llm_commands.operations.RunPostgresSQL(
+            sql="CREATE INDEX hotels_title_trgm_idx ON hotels USING gin (UPPER(property_title) gin_trgm_ops)",
+            reverse_sql="DROP INDEX hotels_title_trgm_idx",
+        ),
+        llm_commands.operations.RunPostgresSQL(
+            sql="CREATE INDEX hotels_city_trgm_idx ON hotels USING gin (UPPER(city_name) gin_trgm_ops)",
+            reverse_sql="DROP INDEX hotels_city_trgm_idx",
+        ),
+        migrations.AddIndex(
+            model_name='propertyrating',
+            index=models.Index(fields=['property', '-created_at'], name='rating_property_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='summary',
+            index=models.Index(fields=['property', '-created_at'], name='summary_property_created_idx'),
+        ),
+        migrations.RunPython(keep_latest_result_current, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='propertyrating',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_current', True)), fields=('property',), name='one_current_rating_per_hotel'),
+        ),
+        migrations.AddConstraint(
+            model_name='summary',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_current', True)), fields=('property',), name='one_current_summary_per_hotel'),
+        ),
+    ]
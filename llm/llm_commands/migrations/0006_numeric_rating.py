@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:38
+
+from django.db import migrations, models
+
+NUMBER_PATTERN = r"^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$"
+
+
+def null_non_numeric_ratings(apps, schema_editor):
+    """Set ratings that can't be read as a number (e.g. "") to NULL before the type change."""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "UPDATE hotels SET rating = NULL WHERE rating IS NOT NULL AND rating::text !~ %s",
+            [NUMBER_PATTERN],
+        )
+        return
+
+    Hotel = apps.get_model("llm_commands", "Hotel")
+    invalid = []
+    for pk, rating in Hotel.objects.exclude(rating=None).values_list("pk", "rating").iterator():
+        try:
+            float(rating)
+        except (TypeError, ValueError):
+            invalid.append(pk)
+    Hotel.objects.filter(pk__in=invalid).update(rating=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm_commands', '0005_indexes_and_current_results'),
+    ]
+
+    operations = [
+        migrations.RunPython(null_non_numeric_ratings, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='hotel',
+            name='rating',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['price'], name='hotels_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['rating'], name='hotels_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:50
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+import llm_commands.operations
+
+# Same weights as llm_commands.search: title A, current summary B,
+# description C, current review D.
+POSTGRES_BACKFILL = """
+UPDATE hotels SET search_vector =
+    setweight(to_tsvector('english', coalesce(property_title, '')), 'A')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT summary FROM llm_commands_summary
+        WHERE property_id = hotels.id AND is_current
+    ), '')), 'B')
+    || setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT review FROM llm_commands_propertyrating
+        WHERE property_id = hotels.id AND is_current
+    ), '')), 'D')
+"""
+
+SQLITE_BACKFILL = """
+INSERT INTO hotel_search (rowid, title, description, summary, review)
+SELECT h.id, coalesce(h.property_title, ''), coalesce(h.description, ''),
+       coalesce(s.summary, ''), coalesce(r.review, '')
+FROM hotels h
+LEFT JOIN llm_commands_summary s ON s.property_id = h.id AND s.is_current
+LEFT JOIN llm_commands_propertyrating r ON r.property_id = h.id AND r.is_current
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm_commands', '0006_numeric_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hotel',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        llm_commands.operations.RunPostgresSQL(POSTGRES_BACKFILL, migrations.RunSQL.noop),
+        # Kept out of the model state, like the trigram indexes in 0005.
+        llm_commands.operations.RunPostgresSQL(
+            "CREATE INDEX hotels_search_vector_idx ON hotels USING gin (search_vector)",
+            "DROP INDEX IF EXISTS hotels_search_vector_idx",
+        ),
+        # SQLite has no tsvector; llm_commands.search uses an FTS5 table there.
+        llm_commands.operations.RunSQLiteSQL(
+            [
+                "CREATE VIRTUAL TABLE hotel_search USING fts5("
+                "title, description, summary, review, tokenize = 'porter unicode61')",
+                SQLITE_BACKFILL,
+            ],
+            "DROP TABLE IF EXISTS hotel_search",
+        ),
+    ]
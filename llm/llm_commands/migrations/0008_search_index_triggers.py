@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations
+
+import llm_commands.operations
+
+# Keep the search index current for writes made outside Django, such as the
+# scraper's upserts. The triggers index a hotel's title and description as it
+# is inserted or they change; summaries and reviews are still indexed by
+# llm_commands.search.update_search_index when they are written.
+
+# Same expression as the 0007 backfill and llm_commands.search.search_vector.
+POSTGRES_TRIGGER = """
+CREATE FUNCTION hotels_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.property_title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT summary FROM llm_commands_summary
+            WHERE property_id = NEW.id AND is_current
+        ), '')), 'B')
+        || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT review FROM llm_commands_propertyrating
+            WHERE property_id = NEW.id AND is_current
+        ), '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER hotels_search_vector_update
+    BEFORE INSERT OR UPDATE OF property_title, description ON hotels
+    FOR EACH ROW EXECUTE FUNCTION hotels_search_vector_update();
+"""
+
+POSTGRES_DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS hotels_search_vector_update ON hotels;
+DROP FUNCTION IF EXISTS hotels_search_vector_update();
+"""
+
+# Hotels inserted since 0007 that nothing has indexed yet; the no-op update
+# fires the trigger, which computes their vectors.
+POSTGRES_BACKFILL = "UPDATE hotels SET property_title = property_title WHERE search_vector IS NULL"
+
+# Triggers are dropped when SQLite remakes a table, so a later migration
+# that alters the hotels table there has to create them again.
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER hotels_search_insert AFTER INSERT ON hotels BEGIN
+        DELETE FROM hotel_search WHERE rowid = new.id;
+        INSERT INTO hotel_search (rowid, title, description, summary, review)
+        VALUES (new.id, coalesce(new.property_title, ''), coalesce(new.description, ''), '', '');
+    END
+    """,
+    """
+    CREATE TRIGGER hotels_search_update AFTER UPDATE OF property_title, description ON hotels BEGIN
+        UPDATE hotel_search
+        SET title = coalesce(new.property_title, ''), description = coalesce(new.description, '')
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER hotels_search_delete AFTER DELETE ON hotels BEGIN
+        DELETE FROM hotel_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    INSERT INTO hotel_search (rowid, title, description, summary, review)
+    SELECT h.id, coalesce(h.property_title, ''), coalesce(h.description, ''),
+           coalesce(s.summary, ''), coalesce(r.review, '')
+    FROM hotels h
+    LEFT JOIN llm_commands_summary s ON s.property_id = h.id AND s.is_current
+    LEFT JOIN llm_commands_propertyrating r ON r.property_id = h.id AND r.is_current
+    WHERE h.id NOT IN (SELECT rowid FROM hotel_search)
+    """,
+]
+
+SQLITE_DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS hotels_search_insert",
+    "DROP TRIGGER IF EXISTS hotels_search_update",
+    "DROP TRIGGER IF EXISTS hotels_search_delete",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm_commands', '0007_full_text_search'),
+    ]
+
+    operations = [
+        llm_commands.operations.RunPostgresSQL(POSTGRES_TRIGGER, POSTGRES_DROP_TRIGGER),
+        llm_commands.operations.RunPostgresSQL(POSTGRES_BACKFILL, migrations.RunSQL.noop),
+        llm_commands.operations.RunSQLiteSQL(SQLITE_TRIGGERS, SQLITE_DROP_TRIGGERS),
+    ]
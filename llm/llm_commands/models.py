@@ -1,21 +1,54 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+
+class HotelQuerySet(models.QuerySet):
+    def with_current_results(self):
+        """
+        Annotate each hotel with its current summary, rating and review.
+
+        The subqueries use the is_current constraints, so the hotel and its
+        current results come back in a single query.
+        """
+        summaries = Summary.objects.filter(property=models.OuterRef("pk"), is_current=True)
+        ratings = PropertyRating.objects.filter(property=models.OuterRef("pk"), is_current=True)
+        return self.annotate(
+            current_summary=models.Subquery(summaries.values("summary")[:1]),
+            current_rating=models.Subquery(ratings.values("rating")[:1]),
+            current_review=models.Subquery(ratings.values("review")[:1]),
+        )
+
+
 class Hotel(models.Model):
     property_title = models.CharField(max_length=255, default="Untitled Hotel")
     description = models.TextField(null=True, blank=True, default="No description available.")
     city_name = models.CharField(max_length=255)  # City where the hotel is located
     hotel_id = models.CharField(max_length=255, unique=True)  # Unique identifier for the hotel
     price = models.FloatField(null=True, blank=True)  # Price of the hotel room
-    rating = models.CharField(max_length=255, null=True, blank=True)  # Rating of the hotel
+    rating = models.FloatField(null=True, blank=True)  # Rating of the hotel (0-5); NULL when unrated
     address = models.CharField(max_length=255, null=True, blank=True)  # Address of the hotel
     latitude = models.FloatField(null=True, blank=True)  # Latitude of the hotel location
     longitude = models.FloatField(null=True, blank=True)  # Longitude of the hotel location
     room_type = models.CharField(max_length=255, null=True, blank=True)  # Room type (e.g., deluxe, suite)
     image = models.CharField(max_length=255, null=True, blank=True)  # Path to the image of the hotel
     description = models.TextField(null=True, blank=True)  # Property description
+    # Full-text index over the title, description and current summary and
+    # review, maintained by llm_commands.search (Postgres only; SQLite uses
+    # the hotel_search FTS5 table instead).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = HotelQuerySet.as_manager()
 
     class Meta:
         db_table = "hotels"
+        indexes = [
+            models.Index(fields=["city_name"], name="hotels_city_name_idx"),
+            models.Index(fields=["price"], name="hotels_price_idx"),
+            models.Index(fields=["rating"], name="hotels_rating_idx"),
+        ]
+        # Migration 0005 also adds Postgres-only GIN trigram indexes on
+        # UPPER(property_title) and UPPER(city_name) for the admin search,
+        # and 0007 a GIN index on search_vector.
 
     def __str__(self):
         return self.property_title
@@ -26,8 +59,62 @@ class Hotel(models.Model):
 class Summary(models.Model):
     property = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name="summaries")
     summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    is_current = models.BooleanField(default=True)  # False once a newer summary replaces it
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["property", "-created_at"], name="summary_property_created_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["property"],
+                condition=models.Q(is_current=True),
+                name="one_current_summary_per_hotel",
+            ),
+        ]
 
 class PropertyRating(models.Model):
     property = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name="ratings")
     rating = models.FloatField()
-    review = models.TextField()
\ No newline at end of file
+    review = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    is_current = models.BooleanField(default=True)  # False once a newer rating replaces it
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["property", "-created_at"], name="rating_property_created_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["property"],
+                condition=models.Q(is_current=True),
+                name="one_current_rating_per_hotel",
+            ),
+        ]
+
+class ProcessingState(models.Model):
+    """Progress of an LLM command for one hotel, so re-runs skip unchanged hotels."""
+
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, related_name="processing_states")
+    task = models.CharField(max_length=64)  # Name of the management command
+    input_hash = models.CharField(max_length=64)  # Hash of the hotel content the result is based on
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES)
+    attempts = models.PositiveIntegerField(default=0)  # Attempts since the content last changed
+    last_error = models.TextField(blank=True, default="")
+    last_processed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["hotel", "task"], name="unique_processing_state_per_task"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} {self.hotel_id}: {self.status}"
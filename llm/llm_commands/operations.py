@@ -0,0 +1,46 @@
+from django.contrib.postgres import operations as postgres_operations
+from django.db import migrations
+
+
+class VendorOnlyMixin:
+    """
+    Apply a migration operation's SQL on one database vendor only.
+
+    The migration state changes on every database, so the migrations still
+    apply (in both directions) to the SQLite databases the benchmarks use.
+    """
+
+    vendor = None
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class PostgresOnlyMixin(VendorOnlyMixin):
+    vendor = "postgresql"
+
+
+class SQLiteOnlyMixin(VendorOnlyMixin):
+    vendor = "sqlite"
+
+
+class RunPostgresSQL(PostgresOnlyMixin, migrations.RunSQL):
+    """
+    RunSQL for Postgres-only DDL, such as GIN trigram indexes.
+
+    Such indexes are kept out of the model state: SQLite recreates every
+    index in the state whenever it remakes a table, and can't build them.
+    """
+
+
+class RunSQLiteSQL(SQLiteOnlyMixin, migrations.RunSQL):
+    """RunSQL for SQLite-only DDL, such as the FTS5 search table."""
+
+
+class TrigramExtension(PostgresOnlyMixin, postgres_operations.TrigramExtension):
+    """Install pg_trgm for the trigram indexes."""
@@ -0,0 +1,38 @@
+import math
+
+
+def estimate_tokens(text):
+    """Rough token count for English text (about four characters per token)."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / 4)
+
+
+class PromptPacker:
+    """
+    Group items into packs whose estimated output fits one response.
+
+    Items are packed greedily in order until adding the next one would push
+    the estimated output over `headroom` of `max_output_tokens`, or the pack
+    holds `max_items`. An item that is too large on its own still gets a pack
+    of its own, so nothing is dropped.
+    """
+
+    def __init__(self, max_output_tokens, max_items, headroom=0.8):
+        self.budget = max_output_tokens * headroom
+        self.max_items = max(1, max_items)
+
+    def pack(self, items, estimate):
+        """Yield lists of items; `estimate` maps an item to its expected output tokens."""
+        pack = []
+        used = 0
+        for item in items:
+            tokens = estimate(item)
+            if pack and (used + tokens > self.budget or len(pack) >= self.max_items):
+                yield pack
+                pack = []
+                used = 0
+            pack.append(item)
+            used += tokens
+        if pack:
+            yield pack
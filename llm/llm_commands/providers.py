@@ -0,0 +1,136 @@
+import hashlib
+import json
+import re
+import time
+
+from decouple import config
+
+from llm_commands.gemini import GeminiClient
+
+PROVIDERS = ("gemini", "ollama", "fake")
+
+
+class OpenAICompatibleClient(GeminiClient):
+    """
+    Client for OpenAI-compatible chat completion servers, such as Ollama's /v1 API.
+
+    Shares the pooled session, retries, rate limiting, caching and latency
+    histogram of GeminiClient; responses are converted to the generateContent
+    shape so the commands parse every provider the same way. Concurrent
+    requests reuse the kept-alive connections, so a local server can work on
+    as many prompts at once as it is configured for (OLLAMA_NUM_PARALLEL).
+    """
+
+    base_url = "http://localhost:11434/v1"
+
+    def __init__(self, model="llama3", base_url=None, api_key=None, **kwargs):
+        super().__init__(api_key, model=model, base_url=base_url, **kwargs)
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    @property
+    def url(self):
+        return f"{self.base_url}/chat/completions"
+
+    def build_payload(self, prompt, generation_config):
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": generation_config.get("temperature"),
+            "top_p": generation_config.get("topP"),
+            "max_tokens": generation_config.get("maxOutputTokens"),
+            "stream": False,
+        }
+
+    def request_params(self):
+        return None
+
+    def parse_response(self, result):
+        text = result["choices"][0]["message"]["content"]
+        response = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+        usage = result.get("usage")
+        if usage:
+            response["usageMetadata"] = {
+                "promptTokenCount": usage.get("prompt_tokens"),
+                "candidatesTokenCount": usage.get("completion_tokens"),
+            }
+        return response
+
+
+class FakeClient(GeminiClient):
+    """
+    Deterministic stand-in for an LLM, for benchmarks and dry runs.
+
+    Answers each prompt without any network traffic, in the format the
+    prompt asks for, and derives the content from a hash of the prompt so
+    repeated runs produce identical results. `latency` adds a fixed delay
+    per request to model a real backend.
+    """
+
+    def __init__(self, latency=0.0, **kwargs):
+        super().__init__(None, model="fake", **kwargs)
+        self.fake_latency = latency
+
+    def request(self, prompt, generation_config):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        started = time.perf_counter()
+        if self.fake_latency:
+            time.sleep(self.fake_latency)
+        text = self.respond(prompt)
+        self.latency.observe(time.perf_counter() - started)
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    def respond(self, prompt):
+        return fake_response_text(prompt)
+
+
+def fake_response_text(prompt):
+    """
+    Deterministic answer to `prompt` in the format it asks for.
+
+    Shared by FakeClient and the fake Gemini server in benchmarks/.
+    """
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    words = " ".join(f"word{digest[i:i + 2]}" for i in range(0, 64, 2))
+    rating = int(digest[:2], 16) % 51 / 10
+
+    hotel_ids = re.findall(r"Hotel ID: (\d+)", prompt)
+    if hotel_ids:
+        return json.dumps([
+            {"hotel_id": int(hotel_id), "title": f"Hotel {hotel_id} {digest[:6]}", "description": words}
+            for hotel_id in hotel_ids
+        ])
+    if '"summary"' in prompt:
+        return json.dumps({"summary": words, "rating": rating, "review": words})
+    if "Rating:" in prompt:
+        return f"Rating: {rating}\nReview: {words}"
+    if "Description:" in prompt and "Title:" in prompt and "rewrite" in prompt:
+        return f"Title: Hotel {digest[:6]}\nDescription: {words}"
+    return words
+
+
+def create_client(provider=None):
+    """
+    Build the LLM client for `provider`, defaulting to the LLM_PROVIDER setting.
+
+    "gemini" reads GEMINI_API_KEY and GEMINI_BASE_URL; "ollama" talks to an
+    OpenAI-compatible server at LLM_BASE_URL using LLM_MODEL; "fake" answers
+    locally after FAKE_LLM_LATENCY seconds.
+    """
+    provider = provider or config("LLM_PROVIDER", default="gemini")
+    if provider == "gemini":
+        return GeminiClient(
+            config("GEMINI_API_KEY"),
+            model="gemini-pro",
+            base_url=config("GEMINI_BASE_URL", default=None),
+        )
+    if provider == "ollama":
+        return OpenAICompatibleClient(
+            model=config("LLM_MODEL", default="llama3"),
+            base_url=config("LLM_BASE_URL", default=None),
+            api_key=config("LLM_API_KEY", default=None),
+        )
+    if provider == "fake":
+        return FakeClient(latency=config("FAKE_LLM_LATENCY", default=0.0, cast=float))
+    raise ValueError(f"Unknown LLM provider: {provider}")
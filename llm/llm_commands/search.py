@@ -0,0 +1,121 @@
+"""
+Full-text search over hotel titles, descriptions and current summaries and reviews.
+
+On Postgres each hotel's `search_vector` holds a weighted tsvector (title
+A, summary B, description C, review D) with a GIN index, and searches are
+ranked with ts_rank. SQLite keeps the same text in the `hotel_search` FTS5
+table (see migration 0007) and ranks with bm25. Database triggers (migration
+0008) index a hotel's title and description whenever any writer, including
+the scraper, inserts or changes them; `update_search_index` refreshes the
+summary and review parts when the LLM commands or the views write those.
+Other database vendors have no search index.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery
+from .models import Hotel, Summary, PropertyRating
+
+SEARCH_CONFIG = "english"
+SQLITE_TABLE = "hotel_search"
+# bm25 column weights for (title, description, summary, review), mirroring
+# the A-D weights used on Postgres.
+SQLITE_WEIGHTS = (10.0, 2.0, 5.0, 1.0)
+# Hotels per statement, well under SQLite's limit on query parameters.
+UPDATE_CHUNK_SIZE = 500
+
+
+class SearchNotSupported(NotImplementedError):
+    """The database has no full-text index to search."""
+
+
+def search_vector():
+    """The weighted tsvector expression stored in Hotel.search_vector."""
+    summaries = Summary.objects.filter(property=OuterRef("pk"), is_current=True).values("summary")[:1]
+    reviews = PropertyRating.objects.filter(property=OuterRef("pk"), is_current=True).values("review")[:1]
+    return (
+        SearchVector("property_title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(Subquery(summaries), weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+        + SearchVector(Subquery(reviews), weight="D", config=SEARCH_CONFIG)
+    )
+
+
+def chunks(ids, size):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def update_search_index(hotel_ids):
+    """
+    Recompute the search index entries of the given hotels from their
+    current title, description, summary and review.
+
+    Call it in the same transaction as the write, after it.
+    """
+    for ids in chunks(hotel_ids, UPDATE_CHUNK_SIZE):
+        if connection.vendor == "postgresql":
+            Hotel.objects.filter(pk__in=ids).update(search_vector=search_vector())
+        elif connection.vendor == "sqlite":
+            update_sqlite_index(ids)
+
+
+def update_sqlite_index(ids):
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})", ids)
+        cursor.execute(
+            f"""
+            INSERT INTO {SQLITE_TABLE} (rowid, title, description, summary, review)
+            SELECT h.id, coalesce(h.property_title, ''), coalesce(h.description, ''),
+                   coalesce(s.summary, ''), coalesce(r.review, '')
+            FROM {Hotel._meta.db_table} h
+            LEFT JOIN {Summary._meta.db_table} s ON s.property_id = h.id AND s.is_current
+            LEFT JOIN {PropertyRating._meta.db_table} r ON r.property_id = h.id AND r.is_current
+            WHERE h.id IN ({placeholders})
+            """,
+            ids,
+        )
+
+
+def fts5_query(text):
+    """Quote each word, so user input can't use FTS5 query syntax; words are ANDed."""
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+def search_hotels(text, fields, limit=20):
+    """
+    Return up to `limit` hotels matching `text` as dicts of `fields` plus
+    `rank`, best match first.
+
+    On Postgres `text` is parsed like a web search (quoted phrases, OR,
+    -word). Only the matching rows are ranked, so latency follows the
+    number of matches rather than the size of the catalogue.
+
+    Raises SearchNotSupported on databases other than Postgres and SQLite.
+    """
+    if not text.strip():
+        return []
+
+    if connection.vendor == "postgresql":
+        query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+        return list(
+            Hotel.objects.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "pk")
+            .values(*fields, "rank")[:limit]
+        )
+
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, -bm25({SQLITE_TABLE}, %s, %s, %s, %s) AS rank FROM {SQLITE_TABLE} "
+                f"WHERE {SQLITE_TABLE} MATCH %s ORDER BY rank DESC, rowid LIMIT %s",
+                [*SQLITE_WEIGHTS, fts5_query(text), limit],
+            )
+            ranks = dict(cursor.fetchall())
+        rows = Hotel.objects.filter(pk__in=ranks).values("pk", *fields)
+        rows = sorted(rows, key=lambda row: (-ranks[row["pk"]], row["pk"]))
+        return [dict(row, rank=ranks[row.pop("pk")]) for row in rows]
+
+    raise SearchNotSupported(f"Full-text search isn't supported on {connection.vendor}")
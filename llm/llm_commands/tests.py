@@ -1,10 +1,18 @@
+import asyncio
+import io
 import unittest
 import sys
 import os
-from unittest.mock import patch, MagicMock
+import tempfile
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, AsyncMock, MagicMock
 
 # Ensure the project root is in the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# The scraper's pipelines and schema are tested against the Django models
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'scraper')))
 
 # Set up Django environment for testing
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'llm.settings')
@@ -14,10 +22,99 @@ django.setup()
 from llm_commands.management.commands.rewrite_hotel_data import Command as RewriteCommand
 from llm_commands.management.commands.generate_summaries_and_ratings import Command as GenerateCommand
 from llm_commands.models import Hotel, Summary, PropertyRating
+from llm_commands.throttling import AdaptiveTokenBucket
+from llm_commands.cache import ResponseCache
+from llm_commands.work_state import WorkState, content_hash
+from llm_commands.batching import BatchBuffer, iter_by_pk
+from llm_commands.gemini import GeminiClient, LatencyHistogram
+from llm_commands.packing import PromptPacker, estimate_tokens
+from llm_commands.providers import FakeClient, OpenAICompatibleClient, create_client
+from llm_commands.metrics import RunMetrics
+from llm_commands.fragments import SCRAPED_FIELDS, hotel_fragment_key, invalidate_hotels
+from llm_commands import api, views
+from llm_commands.admin import CityFilter, EstimatedCountPaginator, RatingRangeFilter
+from llm_commands import search
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+from sqlalchemy import BigInteger, Float, String, Text, create_engine, select
+
+try:
+    from trip.db.models import hotels as hotels_table, metadata as scraper_metadata
+    from trip.pipelines import CityExportPipeline, PostgresPipeline
+    from trip.spiders.async_trip_spider import AsyncHotelSpider
+    from scrapy.exceptions import CloseSpider
+    from scrapy.http import HtmlResponse
+except ImportError:  # the django_app container only has the llm project
+    PostgresPipeline = None
+
+requires_scraper = unittest.skipIf(PostgresPipeline is None, "scraper project not available")
+
+
+def patch_work_state():
+    """Patch the commands' WorkState so handle() processes every hotel without a database."""
+    work_state = MagicMock()
+    work_state.return_value.pending.side_effect = lambda hotels, input_hash: iter(hotels)
+    work_state.return_value.seen = 0
+    work_state.return_value.skipped = 0
+    return patch('llm_commands.base.WorkState', work_state)
+
+
+GEMINI_OK = {"candidates": [{"content": {"parts": [{"text": "Summary"}]}}]}
+
+
+class StubGeminiServer:
+    """
+    Local HTTP server that answers generateContent calls with canned responses.
+
+    `responses` is a list of (status, headers, body) tuples served in order;
+    requests and the client ports they arrived from are recorded.
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.connections = set()
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                stub.requests.append({"path": self.path, "body": json.loads(self.rfile.read(length))})
+                stub.connections.add(self.client_address)
+                status, headers, body = stub.responses.pop(0)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
 
 
 class TestRewriteHotelDataCommand(unittest.TestCase):
     def setUp(self):
+        work_state = patch_work_state()
+        self.work_state = work_state.start().return_value
+        self.addCleanup(work_state.stop)
         self.hotel = MagicMock(
             id=1,
             property_title="Old Hotel Title",
@@ -52,7 +149,7 @@ class TestRewriteHotelDataCommand(unittest.TestCase):
         mock_queryset = MagicMock()
         mock_queryset.count.return_value = 1
         mock_queryset.__iter__.return_value = iter([self.hotel])
-        with patch('llm_commands.models.Hotel.objects.all', return_value=mock_queryset):
+        with patch('llm_commands.management.commands.rewrite_hotel_data.Command.iter_hotels', return_value=mock_queryset):
             with patch('llm_commands.management.commands.rewrite_hotel_data.Command.call_gemini_api', side_effect=Exception("API error")):
                 command = RewriteCommand()
                 command.stdout = MagicMock()
@@ -86,7 +183,7 @@ class TestRewriteHotelDataCommand(unittest.TestCase):
     def test_handle_with_no_hotels(self):
         mock_queryset = MagicMock()
         mock_queryset.count.return_value = 0
-        with patch('llm_commands.models.Hotel.objects.all', return_value=mock_queryset):
+        with patch('llm_commands.management.commands.rewrite_hotel_data.Command.iter_hotels', return_value=mock_queryset):
             command = RewriteCommand()
             command.stdout = MagicMock()
             command.handle()
@@ -94,12 +191,159 @@ class TestRewriteHotelDataCommand(unittest.TestCase):
                 '\x1b[32;1m\n                Processing completed:\n'
                 '                - Total hotels: 0\n'
                 '                - Successfully updated: 0\n'
-                '                - Skipped: 0\n                \x1b[0m'
+                '                - Skipped: 0\n'
+                '                - Unchanged since last run: 0\n                \x1b[0m'
             )
 
+    def test_handle_updates_hotels_concurrently(self):
+        hotels = [MagicMock(id=i, property_title=f"Hotel {i}", description="Old") for i in range(1, 6)]
+        mock_queryset = MagicMock()
+        mock_queryset.count.return_value = len(hotels)
+        mock_queryset.__iter__.return_value = iter(hotels)
+        api_response = {
+            "candidates": [{"content": {"parts": [{"text": "Title: New Title\nDescription: New description."}]}}]
+        }
+        with patch('llm_commands.management.commands.rewrite_hotel_data.Command.iter_hotels', return_value=mock_queryset):
+            with patch('llm_commands.management.commands.rewrite_hotel_data.Command.call_gemini_api', return_value=api_response):
+                with patch('llm_commands.management.commands.rewrite_hotel_data.Command.write_batch') as mock_write_batch:
+                    command = RewriteCommand()
+                    command.stdout = MagicMock()
+                    command.handle(concurrency=3, rate=100.0, batch_size=2)
+        written = [hotel for call in mock_write_batch.call_args_list for hotel in call[0][0]]
+        self.assertEqual(sorted(hotel.id for hotel in written), [1, 2, 3, 4, 5])
+        self.assertEqual([len(call[0][0]) for call in mock_write_batch.call_args_list], [2, 2, 1])
+        for hotel in hotels:
+            self.assertEqual(hotel.property_title, "New Title")
+
+    @patch('llm_commands.management.commands.rewrite_hotel_data.update_search_index')
+    @patch('llm_commands.management.commands.rewrite_hotel_data.invalidate_hotels')
+    @patch('llm_commands.management.commands.rewrite_hotel_data.transaction.atomic')
+    @patch('llm_commands.management.commands.rewrite_hotel_data.Hotel.objects.bulk_update')
+    def test_write_batch_updates_only_rewritten_fields(self, mock_bulk_update, _, mock_invalidate, mock_reindex):
+        hotels = [MagicMock(id=1, property_title="New Title", description="New description.")]
+        command = RewriteCommand()
+        command.work_state = MagicMock()
+        command.write_batch(hotels)
+        mock_bulk_update.assert_called_once_with(hotels, fields=["property_title", "description"])
+        marked = list(command.work_state.mark_done.call_args[0][0])
+        self.assertEqual(marked, [(hotels[0], content_hash("New Title", "New description."))])
+        self.assertEqual(list(mock_invalidate.call_args[0][0]), [hotels[0].pk])
+        self.assertEqual(list(mock_reindex.call_args[0][0]), [hotels[0].pk])
+
+
+    def packed_response(self, entries):
+        return {"candidates": [{"content": {"parts": [{"text": "```json\n" + json.dumps(entries) + "\n```"}]}}]}
+
+    def test_packed_prompt_lists_every_hotel_id(self):
+        hotels = [MagicMock(id=i, property_title=f"Hotel {i}", description="Old") for i in (7, 8)]
+        prompt = RewriteCommand().create_packed_prompt(hotels)
+        self.assertIn("Hotel ID: 7", prompt)
+        self.assertIn("Hotel ID: 8", prompt)
+        self.assertIn("JSON array", prompt)
+
+    def test_extract_packed_content_validates_entries(self):
+        hotels = [MagicMock(id=i) for i in (1, 2, 3)]
+        response = self.packed_response([
+            {"hotel_id": 1, "title": "One", "description": "First."},
+            {"hotel_id": "2", "title": "Two", "description": ""},
+            {"hotel_id": 9, "title": "Nine", "description": "Unknown hotel."},
+            {"hotel_id": 1, "title": "Again", "description": "Duplicate."},
+            "not an object",
+        ])
+        results = RewriteCommand().extract_packed_content(response, hotels)
+        self.assertEqual(results, {1: ("One", "First.")})
+
+    def test_extract_packed_content_with_invalid_json(self):
+        response = {"candidates": [{"content": {"parts": [{"text": "Title: Not JSON"}]}}]}
+        self.assertEqual(RewriteCommand().extract_packed_content(response, [self.hotel]), {})
+
+    @patch('llm_commands.management.commands.rewrite_hotel_data.Command.call_gemini_api')
+    def test_rewrite_pack_retries_only_missing_hotels(self, mock_call_gemini_api):
+        hotels = [MagicMock(id=i, property_title=f"Hotel {i}", description="Old") for i in (1, 2, 3)]
+        mock_call_gemini_api.side_effect = [
+            self.packed_response([
+                {"hotel_id": 1, "title": "One", "description": "First."},
+                {"hotel_id": 3, "title": "Three", "description": "Third."},
+            ]),
+            self.packed_response([{"hotel_id": 2, "title": "Two", "description": "Second."}]),
+        ]
+        command = RewriteCommand()
+        command.client = FakeClient()
+        command.max_output_tokens = 4096
+        results = command.rewrite_pack(hotels)
+        self.assertEqual(sorted(results), [1, 2, 3])
+        retry_prompt = mock_call_gemini_api.call_args_list[1][0][0]
+        self.assertIn("Hotel ID: 2", retry_prompt)
+        self.assertNotIn("Hotel ID: 1", retry_prompt)
+        self.assertEqual(mock_call_gemini_api.call_args[0][1]["maxOutputTokens"], 4096)
+
+    def test_handle_packs_hotels_into_fewer_prompts(self):
+        hotels = [MagicMock(id=i, property_title=f"Hotel {i}", description="Old") for i in range(1, 6)]
+        mock_queryset = MagicMock()
+        mock_queryset.__iter__.return_value = iter(hotels)
+
+        def respond(prompt, generation_config=None):
+            ids = [int(line.split(":")[1]) for line in prompt.splitlines() if "Hotel ID:" in line]
+            return self.packed_response(
+                [{"hotel_id": i, "title": f"New {i}", "description": "New description."} for i in ids]
+            )
+
+        with patch('llm_commands.management.commands.rewrite_hotel_data.Command.iter_hotels', return_value=mock_queryset):
+            with patch('llm_commands.management.commands.rewrite_hotel_data.Command.call_gemini_api', side_effect=respond) as mock_call:
+                with patch('llm_commands.management.commands.rewrite_hotel_data.Command.write_batch'):
+                    command = RewriteCommand()
+                    command.stdout = MagicMock()
+                    command.handle(pack_size=2, rate=100.0)
+        self.assertEqual(mock_call.call_count, 3)
+        self.assertEqual([hotel.property_title for hotel in hotels], [f"New {i}" for i in range(1, 6)])
+
+
+class TestPromptPacker(unittest.TestCase):
+    def test_packs_stay_under_the_token_budget(self):
+        packer = PromptPacker(max_output_tokens=1000, max_items=10, headroom=0.8)
+        packs = list(packer.pack([300, 300, 300, 100, 500], estimate=lambda tokens: tokens))
+        self.assertEqual(packs, [[300, 300], [300, 100], [500]])
+
+    def test_packs_respect_max_items(self):
+        packer = PromptPacker(max_output_tokens=10000, max_items=2)
+        self.assertEqual(list(packer.pack(range(5), estimate=lambda _: 1)), [[0, 1], [2, 3], [4]])
+
+    def test_oversized_items_get_their_own_pack(self):
+        packer = PromptPacker(max_output_tokens=100, max_items=5)
+        self.assertEqual(list(packer.pack([500, 10], estimate=lambda tokens: tokens)), [[500], [10]])
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens(None), 0)
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+        self.assertEqual(estimate_tokens("abcde"), 2)
+
+
+class TestAdaptiveTokenBucket(unittest.TestCase):
+    def test_throttled_halves_rate_and_success_recovers(self):
+        bucket = AdaptiveTokenBucket(10.0)
+        bucket.throttled()
+        self.assertEqual(bucket.rate, 5.0)
+        for _ in range(20):
+            bucket.succeeded()
+        self.assertEqual(bucket.rate, 10.0)
+
+    def test_rate_never_drops_below_minimum(self):
+        bucket = AdaptiveTokenBucket(1.0, min_rate=0.5)
+        for _ in range(5):
+            bucket.throttled()
+        self.assertEqual(bucket.rate, 0.5)
+
+    def test_rejects_non_positive_rate(self):
+        with self.assertRaises(ValueError):
+            AdaptiveTokenBucket(0)
+
 
 class TestGenerateSummariesAndRatingsCommand(unittest.TestCase):
     def setUp(self):
+        work_state = patch_work_state()
+        self.work_state = work_state.start().return_value
+        self.addCleanup(work_state.stop)
         self.hotel = MagicMock(
             id=1,
             property_title="Sample Hotel",
@@ -147,7 +391,7 @@ class TestGenerateSummariesAndRatingsCommand(unittest.TestCase):
         mock_queryset = MagicMock()
         mock_queryset.count.return_value = 1
         mock_queryset.__iter__.return_value = iter([self.hotel])
-        with patch('llm_commands.models.Hotel.objects.all', return_value=mock_queryset):
+        with patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.iter_hotels', return_value=mock_queryset):
             with patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.call_gemini_api', side_effect=Exception("Timeout")):
                 command = GenerateCommand()
                 command.stdout = MagicMock()
@@ -179,7 +423,7 @@ class TestGenerateSummariesAndRatingsCommand(unittest.TestCase):
         mock_queryset.__iter__.return_value = iter([
             MagicMock(property_title=None, description=None, id=1)
         ])
-        with patch('llm_commands.models.Hotel.objects.all', return_value=mock_queryset):
+        with patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.iter_hotels', return_value=mock_queryset):
             command = GenerateCommand()
             command.stdout = MagicMock()
             command.handle()
@@ -189,7 +433,7 @@ class TestGenerateSummariesAndRatingsCommand(unittest.TestCase):
         mock_queryset = MagicMock()
         mock_queryset.count.return_value = 1
         mock_queryset.__iter__.return_value = iter([self.hotel])
-        with patch('llm_commands.models.Hotel.objects.all', return_value=mock_queryset):
+        with patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.iter_hotels', return_value=mock_queryset):
             with patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.call_gemini_api', side_effect=Exception("Timeout")):
                 command = GenerateCommand()
                 command.stdout = MagicMock()
@@ -201,5 +445,849 @@ class TestGenerateSummariesAndRatingsCommand(unittest.TestCase):
                 self.assertTrue(any_error_call, "Expected error message not found in output")
 
 
+    def test_parse_combined_response(self):
+        command = GenerateCommand()
+        text = '```json\n{"summary": "A calm stay.", "rating": 4.2, "review": "Friendly staff."}\n```'
+        self.assertEqual(command.parse_combined_response(text), ("A calm stay.", 4.2, "Friendly staff."))
+
+    def test_parse_combined_response_rejects_invalid_payloads(self):
+        command = GenerateCommand()
+        for text in (
+            "Summary: not json",
+            '{"summary": "A calm stay.", "rating": 7, "review": "Friendly staff."}',
+            '{"summary": "", "rating": 4, "review": "Friendly staff."}',
+            '{"summary": "A calm stay.", "review": "Friendly staff."}',
+        ):
+            self.assertEqual(command.parse_combined_response(text), (None, None, None))
+
+    def test_combined_prompt_includes_hotel_details(self):
+        command = GenerateCommand()
+        prompt = command.generate_combined_prompt(self.hotel)
+        self.assertIn("Sample Hotel", prompt)
+        self.assertIn("This is a sample description.", prompt)
+        self.assertIn('"rating"', prompt)
+
+    @patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.write_batch')
+    @patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.call_gemini_api')
+    def test_handle_makes_one_api_call_per_hotel(self, mock_call_gemini_api, mock_write_batch):
+        mock_call_gemini_api.return_value = {
+            "candidates": [{"content": {"parts": [{"text": '{"summary": "Short.", "rating": 4, "review": "Good."}'}]}}]
+        }
+        mock_queryset = MagicMock()
+        mock_queryset.count.return_value = 1
+        mock_queryset.__iter__.return_value = iter([self.hotel])
+        with patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.iter_hotels', return_value=mock_queryset):
+            command = GenerateCommand()
+            command.stdout = MagicMock()
+            command.handle(no_cache=True)
+        self.assertEqual(mock_call_gemini_api.call_count, 1)
+        mock_write_batch.assert_called_once_with([
+            (self.hotel, content_hash("Sample Hotel", "This is a sample description."), "Short.", 4.0, "Good.")
+        ])
+
+    @patch('llm_commands.management.commands.generate_summaries_and_ratings.update_search_index')
+    @patch('llm_commands.management.commands.generate_summaries_and_ratings.invalidate_hotels')
+    @patch('llm_commands.management.commands.generate_summaries_and_ratings.transaction.atomic')
+    @patch('llm_commands.management.commands.generate_summaries_and_ratings.PropertyRating.objects')
+    @patch('llm_commands.management.commands.generate_summaries_and_ratings.Summary.objects')
+    def test_write_batch_replaces_results_in_bulk(self, mock_summaries, mock_ratings, _, mock_invalidate, mock_reindex):
+        hotel = Hotel(id=1, property_title="Sample Hotel", description="This is a sample description.")
+        command = GenerateCommand()
+        command.work_state = MagicMock()
+        command.write_batch([(hotel, "hash", "Short.", 4.0, "Good.")])
+        # Earlier results are kept but stop being current.
+        mock_summaries.filter.assert_called_once_with(property_id__in=[1], is_current=True)
+        mock_summaries.filter.return_value.update.assert_called_once_with(is_current=False)
+        mock_ratings.filter.assert_called_once_with(property_id__in=[1], is_current=True)
+        mock_ratings.filter.return_value.update.assert_called_once_with(is_current=False)
+        mock_summaries.filter.return_value.delete.assert_not_called()
+        summaries = list(mock_summaries.bulk_create.call_args[0][0])
+        ratings = list(mock_ratings.bulk_create.call_args[0][0])
+        self.assertEqual([summary.summary for summary in summaries], ["Short."])
+        self.assertEqual([(rating.rating, rating.review) for rating in ratings], [(4.0, "Good.")])
+        self.assertEqual(list(command.work_state.mark_done.call_args[0][0]), [(hotel, "hash")])
+        mock_invalidate.assert_called_once_with([1])
+        mock_reindex.assert_called_once_with([1])
+
+
+    def test_handle_with_api_timeout_records_failure(self):
+        mock_queryset = MagicMock()
+        mock_queryset.count.return_value = 1
+        mock_queryset.__iter__.return_value = iter([self.hotel])
+        with patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.iter_hotels', return_value=mock_queryset):
+            with patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.call_gemini_api', side_effect=Exception("Timeout")):
+                command = GenerateCommand()
+                command.stdout = MagicMock()
+                command.handle()
+        [(hotel, input_hash, error)] = list(self.work_state.mark_failed.call_args[0][0])
+        self.assertIs(hotel, self.hotel)
+        self.assertEqual(input_hash, content_hash("Sample Hotel", "This is a sample description."))
+        self.assertEqual(str(error), "Timeout")
+
+
+class TestWorkState(unittest.TestCase):
+    def state(self, input_hash="abc", status="done", attempts=0):
+        return MagicMock(input_hash=input_hash, status=status, attempts=attempts)
+
+    def test_new_hotels_need_processing(self):
+        self.assertFalse(WorkState("task").is_current("abc", None))
+
+    def test_unchanged_done_hotels_are_skipped(self):
+        self.assertTrue(WorkState("task").is_current("abc", self.state()))
+
+    def test_changed_hotels_are_reprocessed(self):
+        self.assertFalse(WorkState("task").is_current("def", self.state()))
+
+    def test_failed_hotels_are_retried_until_max_attempts(self):
+        work_state = WorkState("task", max_attempts=3)
+        self.assertFalse(work_state.is_current("abc", self.state(status="failed", attempts=2)))
+        self.assertTrue(work_state.is_current("abc", self.state(status="failed", attempts=3)))
+
+    def test_force_reprocesses_everything(self):
+        self.assertFalse(WorkState("task", force=True).is_current("abc", self.state()))
+
+    def test_pending_loads_states_per_chunk(self):
+        hotels = [MagicMock(id=i, property_title=f"Hotel {i}", description="") for i in range(5)]
+        done = MagicMock(hotel_id=1, input_hash=content_hash("Hotel 1", ""), status="done", attempts=0)
+        with patch('llm_commands.work_state.ProcessingState.objects.filter', return_value=[done]) as mock_filter:
+            work_state = WorkState("task", chunk_size=2)
+            pending = list(work_state.pending(hotels, lambda h: content_hash(h.property_title, h.description)))
+        self.assertEqual([hotel.id for hotel in pending], [0, 2, 3, 4])
+        self.assertEqual(work_state.skipped, 1)
+        self.assertEqual(mock_filter.call_count, 3)
+
+    @patch('llm_commands.work_state.ProcessingState.objects.bulk_create')
+    def test_mark_done_upserts_states_in_one_query(self, mock_bulk_create):
+        hotels = [Hotel(id=1), Hotel(id=2)]
+        WorkState("task").mark_done([(hotels[0], "a"), (hotels[1], "b")])
+        states = mock_bulk_create.call_args[0][0]
+        self.assertEqual([(state.hotel_id, state.input_hash, state.status) for state in states], [(1, "a", "done"), (2, "b", "done")])
+        self.assertTrue(mock_bulk_create.call_args[1]["update_conflicts"])
+
+    @patch('llm_commands.work_state.ProcessingState.objects.bulk_create')
+    @patch('llm_commands.work_state.ProcessingState.objects.filter')
+    def test_mark_failed_counts_attempts_in_one_upsert(self, mock_filter, mock_bulk_create):
+        mock_filter.return_value.only.return_value = [
+            MagicMock(hotel_id=1, input_hash="a", attempts=1),
+            MagicMock(hotel_id=2, input_hash="old", attempts=2),
+        ]
+        hotels = [Hotel(id=1), Hotel(id=2), Hotel(id=3)]
+        WorkState("task").mark_failed([(hotels[0], "a", "API error"), (hotels[1], "b", "API error"), (hotels[2], "c", ValueError("bad"))])
+        mock_filter.assert_called_once_with(task="task", hotel_id__in=[1, 2, 3])
+        states = mock_bulk_create.call_args[0][0]
+        self.assertEqual(
+            [(state.hotel_id, state.input_hash, state.status, state.attempts, state.last_error) for state in states],
+            [(1, "a", "failed", 2, "API error"), (2, "b", "failed", 1, "API error"), (3, "c", "failed", 1, "bad")],
+        )
+        self.assertTrue(mock_bulk_create.call_args[1]["update_conflicts"])
+
+    def test_content_hash_distinguishes_field_boundaries(self):
+        self.assertNotEqual(content_hash("ab", "c"), content_hash("a", "bc"))
+        self.assertEqual(content_hash(None, "x"), content_hash("", "x"))
+
+
+class FakeQuerySet:
+    """Minimal list-backed stand-in for the queryset methods iter_by_pk uses."""
+
+    def __init__(self, rows, queries):
+        self.rows = rows
+        self.queries = queries
+
+    def order_by(self, field):
+        return FakeQuerySet(sorted(self.rows, key=lambda row: row.pk), self.queries)
+
+    def filter(self, pk__gt):
+        return FakeQuerySet([row for row in self.rows if row.pk > pk__gt], self.queries)
+
+    def __getitem__(self, item):
+        self.queries.append(item)
+        return self.rows[item]
+
+
+class TestIterByPk(unittest.TestCase):
+    def test_streams_every_row_in_pk_order(self):
+        queries = []
+        rows = [MagicMock(pk=pk) for pk in (5, 1, 3, 2, 4)]
+        result = list(iter_by_pk(FakeQuerySet(rows, queries), chunk_size=2))
+        self.assertEqual([row.pk for row in result], [1, 2, 3, 4, 5])
+        self.assertEqual(len(queries), 3)
+
+    def test_empty_queryset(self):
+        self.assertEqual(list(iter_by_pk(FakeQuerySet([], []), chunk_size=2)), [])
+
+
+class TestBatchBuffer(unittest.TestCase):
+    def test_flushes_full_batches_and_remainder(self):
+        batches = []
+        buffer = BatchBuffer(batches.append, batch_size=2)
+        for item in range(5):
+            buffer.add(item)
+        self.assertEqual(batches, [[0, 1], [2, 3]])
+        buffer.flush()
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+        self.assertEqual(buffer.flushed, 5)
+
+    def test_flush_without_items_does_nothing(self):
+        batches = []
+        BatchBuffer(batches.append).flush()
+        self.assertEqual(batches, [])
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_depends_on_prompt_model_and_config(self):
+        key = ResponseCache.make_key("gemini-pro", "prompt", {"temperature": 0.7})
+        self.assertEqual(key, ResponseCache.make_key("gemini-pro", "prompt", {"temperature": 0.7}))
+        self.assertNotEqual(key, ResponseCache.make_key("gemini-pro", "other", {"temperature": 0.7}))
+        self.assertNotEqual(key, ResponseCache.make_key("gemini-pro", "prompt", {"temperature": 0.2}))
+        self.assertNotEqual(key, ResponseCache.make_key("gemini-flash", "prompt", {"temperature": 0.7}))
+
+    def test_hit_and_miss_counters_persist_across_instances(self):
+        cache = ResponseCache(self.path)
+        self.assertIsNone(cache.get("key"))
+        cache.set("key", {"candidates": [1]})
+        cache.close()
+        reopened = ResponseCache(self.path)
+        self.assertEqual(reopened.get("key"), {"candidates": [1]})
+        self.assertEqual(reopened.stats(), {"hits": 1, "misses": 0})
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 1})
+        reopened.close()
+
+    def test_expired_entries_are_misses(self):
+        cache = ResponseCache(self.path, ttl=60)
+        cache.set("key", {"candidates": [1]})
+        with patch('llm_commands.cache.time.time', return_value=10 ** 10):
+            self.assertIsNone(cache.get("key"))
+        cache.close()
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResponseCache(self.path, max_entries=2)
+        with patch('llm_commands.cache.time.time', side_effect=[1, 2, 3, 4]):
+            cache.set("a", {"v": "a"})
+            cache.set("b", {"v": "b"})
+            cache.get("a")
+            cache.set("c", {"v": "c"})
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"v": "a"})
+        self.assertEqual(cache.get("c"), {"v": "c"})
+        cache.close()
+
+    def test_eviction_runs_down_to_the_low_water_mark(self):
+        cache = ResponseCache(self.path, max_entries=10)
+        with patch('llm_commands.cache.time.time', side_effect=range(1, 100)):
+            for i in range(11):
+                cache.set(str(i), {"v": i})
+            self.assertEqual(cache._size, 9)
+            cache.set("9", {"v": "replaced"})
+            self.assertEqual(cache._size, 9)
+            cache.set("11", {"v": 11})
+        self.assertEqual(cache._size, 10)
+        self.assertEqual(cache.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0], 10)
+        self.assertIsNone(cache.get("1"))
+        self.assertEqual(cache.get("9"), {"v": "replaced"})
+        cache.close()
+
+    def test_cached_prompt_skips_the_api(self):
+        with StubGeminiServer([(200, {}, GEMINI_OK)]) as server:
+            command = GenerateCommand()
+            command.client = GeminiClient("key", base_url=server.url, cache=ResponseCache(self.path))
+            first = command.call_gemini_api("prompt")
+            second = command.call_gemini_api("prompt")
+        self.assertEqual(first, second)
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(command.client.cache.stats(), {"hits": 1, "misses": 1})
+        command.client.close()
+
+
+class TestGeminiClient(unittest.TestCase):
+    def client(self, server, **kwargs):
+        kwargs.setdefault("backoff_base", 0)
+        return GeminiClient("key", base_url=server.url, **kwargs)
+
+    def test_sends_prompt_and_reuses_the_connection(self):
+        with StubGeminiServer([(200, {}, GEMINI_OK)] * 3) as server:
+            client = self.client(server)
+            for _ in range(3):
+                self.assertEqual(client.generate("prompt"), GEMINI_OK)
+            client.close()
+        self.assertEqual(server.requests[0]["path"], "/gemini-pro:generateContent?key=key")
+        self.assertEqual(server.requests[0]["body"]["contents"][0]["parts"][0]["text"], "prompt")
+        self.assertEqual(len(server.connections), 1)
+        self.assertEqual(client.latency.snapshot()["count"], 3)
+
+    def test_retries_throttled_and_server_errors(self):
+        responses = [(429, {"Retry-After": "0"}, {}), (503, {}, {}), (200, {}, GEMINI_OK)]
+        with StubGeminiServer(responses) as server:
+            client = self.client(server, rate_limiter=AdaptiveTokenBucket(100.0))
+            self.assertEqual(client.generate("prompt"), GEMINI_OK)
+            client.close()
+        self.assertEqual(len(server.requests), 3)
+        self.assertLess(client.rate_limiter.rate, 100.0)
+
+    def test_retry_after_holds_back_the_shared_rate_limiter(self):
+        bucket = AdaptiveTokenBucket(10.0)
+        with StubGeminiServer([(429, {"Retry-After": "30"}, {})]) as server:
+            client = self.client(server, rate_limiter=bucket, max_retries=0)
+            self.assertIsNone(client.generate("prompt"))
+            client.close()
+        # The wait AdaptiveTokenBucket.acquire would sleep before the next request
+        self.assertGreaterEqual((1 - bucket.tokens) / bucket.rate, 30.0)
+
+    def test_gives_up_after_max_retries(self):
+        with StubGeminiServer([(500, {}, {})] * 3) as server:
+            client = self.client(server, max_retries=2)
+            self.assertIsNone(client.generate("prompt"))
+            client.close()
+        self.assertEqual(len(server.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        with StubGeminiServer([(400, {}, {"error": "bad request"})]) as server:
+            client = self.client(server)
+            self.assertIsNone(client.generate("prompt"))
+            client.close()
+        self.assertEqual(len(server.requests), 1)
+
+    def test_retry_after_accepts_seconds_and_http_dates(self):
+        client = GeminiClient("key")
+        self.assertEqual(client.retry_after(MagicMock(headers={"Retry-After": "7"})), 7.0)
+        self.assertEqual(client.retry_after(MagicMock(headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})), 0.0)
+        self.assertIsNone(client.retry_after(MagicMock(headers={})))
+
+    def test_retry_after_is_capped_at_backoff_max(self):
+        client = GeminiClient("key", backoff_max=5.0)
+        self.assertEqual(client.retry_after(MagicMock(headers={"Retry-After": "3600"})), 5.0)
+        self.assertEqual(client.retry_after(MagicMock(headers={"Retry-After": "Fri, 01 Jan 2100 00:00:00 GMT"})), 5.0)
+
+    def test_backoff_delay_is_capped(self):
+        client = GeminiClient("key", backoff_base=1.0, backoff_max=5.0)
+        for attempt in range(10):
+            self.assertLessEqual(client.backoff_delay(attempt), 5.0)
+
+
+class TestProviders(unittest.TestCase):
+    def test_openai_compatible_client_converts_chat_completions(self):
+        body = {"choices": [{"message": {"role": "assistant", "content": "Summary"}}]}
+        with StubGeminiServer([(200, {}, body)]) as server:
+            client = OpenAICompatibleClient(model="llama3", base_url=server.url, api_key="local")
+            self.assertEqual(client.generate("prompt"), GEMINI_OK)
+            client.close()
+        request = server.requests[0]
+        self.assertEqual(request["path"], "/chat/completions")
+        self.assertEqual(request["body"]["model"], "llama3")
+        self.assertEqual(request["body"]["messages"], [{"role": "user", "content": "prompt"}])
+        self.assertEqual(request["body"]["max_tokens"], 1024)
+
+    def test_fake_client_is_deterministic(self):
+        client = FakeClient()
+        self.assertEqual(client.generate("prompt"), client.generate("prompt"))
+        self.assertNotEqual(client.generate("prompt"), client.generate("other prompt"))
+        self.assertEqual(client.latency.snapshot()["count"], 4)
+
+    def test_fake_client_answers_in_the_requested_format(self):
+        client = FakeClient()
+        hotel = MagicMock(id=3, property_title="Hotel", description="Description")
+        rewrite = RewriteCommand.__new__(RewriteCommand)
+        generate = GenerateCommand.__new__(GenerateCommand)
+
+        title, description = rewrite.extract_content(client.generate(rewrite.create_prompt(hotel)))
+        self.assertTrue(title and description)
+        packed = rewrite.extract_packed_content(client.generate(rewrite.create_packed_prompt([hotel])), [hotel])
+        self.assertEqual(list(packed), [3])
+        summary, rating, review = generate.parse_combined_response(
+            generate.extract_text(client.generate(generate.generate_combined_prompt(hotel)))
+        )
+        self.assertTrue(summary and review)
+        self.assertTrue(0 <= rating <= 5)
+        rating, review = generate.parse_rating_review(
+            generate.extract_text(client.generate(generate.generate_rating_prompt(hotel)))
+        )
+        self.assertIsNotNone(rating)
+
+    def test_create_client(self):
+        self.assertIsInstance(create_client("fake"), FakeClient)
+        self.assertIsInstance(create_client("ollama"), OpenAICompatibleClient)
+        with self.assertRaises(ValueError):
+            create_client("unknown")
+
+    @patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.write_batch')
+    def test_generate_command_runs_concurrently_on_the_fake_provider(self, mock_write_batch):
+        work_state = patch_work_state()
+        work_state.start()
+        self.addCleanup(work_state.stop)
+        hotels = [MagicMock(id=i, property_title=f"Hotel {i}", description="Description") for i in range(1, 6)]
+        with patch('llm_commands.management.commands.generate_summaries_and_ratings.Command.iter_hotels', return_value=hotels):
+            command = GenerateCommand()
+            command.stdout = MagicMock()
+            command.handle(provider="fake", concurrency=3, rate=100.0, no_cache=True)
+        written = [result[0] for call in mock_write_batch.call_args_list for result in call[0][0]]
+        self.assertEqual(sorted(hotel.id for hotel in written), [1, 2, 3, 4, 5])
+        self.assertIsInstance(command.client, FakeClient)
+
+    def test_fake_provider_needs_no_gemini_key(self):
+        environ = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+        hotels = [MagicMock(id=1, property_title="Hotel 1", description="Old")]
+        work_state = patch_work_state()
+        work_state.start()
+        self.addCleanup(work_state.stop)
+        with patch.dict(os.environ, environ, clear=True):
+            with patch('llm_commands.management.commands.rewrite_hotel_data.Command.iter_hotels', return_value=hotels):
+                with patch('llm_commands.management.commands.rewrite_hotel_data.Command.write_batch') as mock_write_batch:
+                    call_command("rewrite_hotel_data", provider="fake", rate=100.0, no_cache=True, stdout=io.StringIO())
+            parser = GenerateCommand().create_parser("manage.py", "generate_summaries_and_ratings")
+            self.assertIn("--provider", parser.format_help())
+        self.assertEqual([hotel.id for hotel in mock_write_batch.call_args[0][0]], [1])
+
+
+class TestRunMetrics(unittest.TestCase):
+    def test_stages_are_counted_and_timed(self):
+        metrics = RunMetrics("rewrite_hotel_data")
+        with metrics.time("parse"):
+            pass
+        with metrics.time("parse"):
+            pass
+        self.assertEqual(list(metrics.timed_iter("db_fetch", [1, 2, 3])), [1, 2, 3])
+        summary = metrics.summary(FakeClient())
+        self.assertEqual(summary["stages"]["parse"]["count"], 2)
+        # One step per item plus the final StopIteration.
+        self.assertEqual(summary["stages"]["db_fetch"]["count"], 4)
+
+    def test_summary_includes_api_latency_and_tokens(self):
+        client = FakeClient()
+        client.generate("abcdefgh")
+        metrics = RunMetrics("generate_summaries_and_ratings")
+        metrics.hotels = 1
+        summary = metrics.summary(client)
+        self.assertEqual(summary["api"]["count"], 1)
+        self.assertEqual(summary["tokens"]["in"], 2)
+        self.assertGreater(summary["tokens"]["out"], 0)
+        self.assertGreater(summary["hotels_per_minute"], 0)
+        self.assertIsNone(summary["cache"])
+
+    def test_reported_usage_is_preferred_over_estimates(self):
+        client = GeminiClient("key")
+        client.record_usage("prompt", {"usageMetadata": {"promptTokenCount": 11, "candidatesTokenCount": 22}})
+        self.assertEqual((client.tokens_in, client.tokens_out), (11, 22))
+
+    def test_write_prometheus_textfile(self):
+        metrics = RunMetrics("rewrite_hotel_data")
+        with metrics.time("db_write"):
+            pass
+        client = FakeClient()
+        client.generate("prompt")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "llm.prom")
+            RunMetrics.write_prometheus(metrics.summary(client), path)
+            with open(path) as f:
+                text = f.read()
+            self.assertEqual(os.listdir(directory), ["llm.prom"])
+        self.assertIn('llm_command_stage_seconds{command="rewrite_hotel_data",stage="db_write"}', text)
+        self.assertIn('llm_command_api_latency_seconds{command="rewrite_hotel_data",quantile="0.99"}', text)
+        self.assertIn('llm_command_tokens{command="rewrite_hotel_data",direction="out"}', text)
+
+    @patch('llm_commands.management.commands.rewrite_hotel_data.Command.write_batch')
+    def test_command_writes_json_summary(self, _):
+        work_state = patch_work_state()
+        work_state.start()
+        self.addCleanup(work_state.stop)
+        hotels = [MagicMock(id=i, property_title=f"Hotel {i}", description="Old") for i in range(1, 4)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.json")
+            with patch('llm_commands.management.commands.rewrite_hotel_data.Command.iter_hotels', return_value=hotels):
+                command = RewriteCommand()
+                command.stdout = MagicMock()
+                command.handle(provider="fake", rate=100.0, no_cache=True, metrics_json=path)
+            with open(path) as f:
+                summary = json.load(f)
+        self.assertEqual(summary["hotels"], 3)
+        self.assertEqual(summary["api"]["count"], 3)
+        self.assertEqual(set(summary["stages"]), {"db_fetch", "prompt_build", "parse"})
+        self.assertFalse(command.client.log_payloads)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles_report_bucket_bounds(self):
+        histogram = LatencyHistogram()
+        for seconds in [0.01] * 90 + [0.3] * 9 + [20.0]:
+            histogram.observe(seconds)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 100)
+        self.assertEqual(snapshot["p50"], 0.05)
+        self.assertEqual(snapshot["p95"], 0.5)
+        self.assertEqual(snapshot["p99"], 0.5)
+        self.assertEqual(histogram.percentile(1.0), 30.0)
+
+    def test_empty_histogram(self):
+        self.assertIsNone(LatencyHistogram().percentile(0.5))
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class TestHotelViews(unittest.TestCase):
+    def setUp(self):
+        settings = override_settings(CACHES=LOCMEM_CACHES, HOTEL_PAGE_SIZE=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.factory = RequestFactory()
+        cache.clear()
+
+    @patch('llm_commands.views.render')
+    @patch('llm_commands.views.Hotel.objects')
+    def test_list_fetches_one_extra_row_for_the_next_cursor(self, mock_objects, mock_render):
+        ordered = mock_objects.only.return_value.order_by.return_value
+        ordered.filter.return_value.__getitem__.return_value = [MagicMock(pk=pk) for pk in (11, 12, 13)]
+        views.hotel_list(self.factory.get("/", {"after": "10"}))
+        mock_objects.only.assert_called_once_with(*views.LIST_FIELDS)
+        ordered.filter.assert_called_once_with(pk__gt=10)
+        ordered.filter.return_value.__getitem__.assert_called_once_with(slice(None, 3))
+        context = mock_render.call_args[0][2]
+        self.assertEqual([hotel.pk for hotel in context["hotels"]], [11, 12])
+        self.assertEqual(context["next_cursor"], 12)
+
+    @patch('llm_commands.views.render')
+    @patch('llm_commands.views.Hotel.objects')
+    def test_list_last_page_has_no_cursor(self, mock_objects, mock_render):
+        ordered = mock_objects.only.return_value.order_by.return_value
+        ordered.__getitem__.return_value = [MagicMock(pk=1)]
+        views.hotel_list(self.factory.get("/", {"after": "not-a-number"}))
+        ordered.filter.assert_not_called()
+        self.assertIsNone(mock_render.call_args[0][2]["next_cursor"])
+
+    SCRAPED = ("Paris", "1 Rue de Rivoli", 120.0, 4.5, "Suite")
+
+    def scraped_hotel(self, scraped):
+        return MagicMock(**dict(zip(SCRAPED_FIELDS, scraped)))
+
+    @patch('llm_commands.views.render')
+    @patch('llm_commands.views.render_to_string', return_value="<h1>Hotel</h1>")
+    @patch('llm_commands.views.get_object_or_404')
+    @patch('llm_commands.views.Hotel.objects')
+    def test_detail_fragment_is_cached_until_invalidated(self, mock_objects, mock_get, mock_render_to_string, mock_render):
+        mock_objects.filter.return_value.values_list.return_value.first.return_value = self.SCRAPED
+        mock_get.return_value = self.scraped_hotel(self.SCRAPED)
+        request = self.factory.get("/hotel/5/")
+        views.hotel_detail(request, 5)
+        views.hotel_detail(request, 5)
+        mock_get.assert_called_once()
+        self.assertEqual(mock_render.call_args[0][2]["fragment"], "<h1>Hotel</h1>")
+
+        with patch('llm_commands.fragments.transaction.on_commit', side_effect=lambda callback: callback()):
+            invalidate_hotels([5])
+        self.assertIsNone(cache.get(hotel_fragment_key(5)))
+        views.hotel_detail(request, 5)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('llm_commands.views.render')
+    @patch('llm_commands.views.render_to_string', side_effect=["<p>120.0</p>", "<p>99.0</p>"])
+    @patch('llm_commands.views.get_object_or_404')
+    @patch('llm_commands.views.Hotel.objects')
+    def test_detail_fragment_is_rerendered_after_a_recrawl(self, mock_objects, mock_get, mock_render_to_string, mock_render):
+        scraped = mock_objects.filter.return_value.values_list.return_value.first
+        scraped.return_value = self.SCRAPED
+        mock_get.return_value = self.scraped_hotel(self.SCRAPED)
+        request = self.factory.get("/hotel/5/")
+        views.hotel_detail(request, 5)
+
+        # The scraper upserts a new price without touching the cache.
+        recrawled = ("Paris", "1 Rue de Rivoli", 99.0, 4.5, "Suite")
+        scraped.return_value = recrawled
+        mock_get.return_value = self.scraped_hotel(recrawled)
+        views.hotel_detail(request, 5)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_render.call_args[0][2]["fragment"], "<p>99.0</p>")
+
+    @patch('llm_commands.views.render')
+    @patch('llm_commands.views.Hotel.objects')
+    def test_async_detail_serves_cached_fragment_without_rendering(self, mock_objects, mock_render):
+        mock_objects.filter.return_value.values_list.return_value.afirst = AsyncMock(return_value=self.SCRAPED)
+        cache.set(hotel_fragment_key(7), (self.SCRAPED, "<h1>Cached</h1>"))
+        asyncio.run(views.ahotel_detail(self.factory.get("/hotel/7/"), 7))
+        mock_objects.filter.assert_called_once_with(pk=7)
+        mock_objects.with_current_results.assert_not_called()
+        self.assertEqual(mock_render.call_args[0][2]["fragment"], "<h1>Cached</h1>")
+
+    def test_public_read_urls_use_the_async_views(self):
+        self.assertIs(resolve("/").func, views.ahotel_list)
+        self.assertIs(resolve("/hotel/3/").func, views.ahotel_detail)
+        self.assertIs(resolve("/api/hotels/").func, api.ahotel_list)
+        self.assertIs(resolve("/api/hotels/3/").func, api.ahotel_detail)
+        self.assertIs(resolve("/api/hotels/export.ndjson").func, api.ahotel_export)
+        self.assertIs(resolve("/api/hotels/search/").func, api.ahotel_search)
+        self.assertIs(resolve("/sync/").func, views.hotel_list)
+        self.assertIs(resolve("/sync/api/hotels/3/").func, api.hotel_detail)
+
+
+class TestHotelApi(unittest.TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_filters_map_to_lookups_and_reject_bad_values(self):
+        queryset = MagicMock()
+        api.filter_hotels(queryset, {"city": "Dhaka", "min_price": "10", "max_rating": "4.5", "min_rating": ""})
+        queryset.filter.assert_called_once_with(city_name="Dhaka", price__gte=10.0, rating__lte=4.5)
+        for value in ("cheap", "nan", "inf"):
+            with self.assertRaises(ValueError):
+                api.filter_hotels(queryset, {"max_price": value})
+
+    def test_list_rejects_invalid_parameters(self):
+        response = api.hotel_list(self.factory.get("/api/hotels/", {"limit": "0"}))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("limit", json.loads(response.content)["error"])
+
+    @patch('llm_commands.api.Hotel.objects')
+    def test_list_pages_with_cursor_and_answers_304_for_matching_etag(self, mock_objects):
+        rows = [{"id": pk} for pk in (1, 2, 3)]
+        mock_objects.order_by.return_value.filter.return_value.values.return_value.__getitem__.return_value = rows
+        response = api.hotel_list(self.factory.get("/api/hotels/", {"limit": "2"}))
+        self.assertEqual(json.loads(response.content), {"results": [{"id": 1}, {"id": 2}], "next": 2})
+
+        etag = response["ETag"]
+        again = api.hotel_list(self.factory.get("/api/hotels/", {"limit": "2"}, HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], etag)
+
+    @patch('llm_commands.api.Hotel.objects')
+    def test_async_list_returns_the_same_page(self, mock_objects):
+        rows = [{"id": pk} for pk in (1, 2, 3)]
+        page = mock_objects.order_by.return_value.filter.return_value.values.return_value.__getitem__.return_value
+        page.__aiter__.return_value = rows
+        response = asyncio.run(api.ahotel_list(self.factory.get("/api/hotels/", {"limit": "2"})))
+        self.assertEqual(json.loads(response.content), {"results": [{"id": 1}, {"id": 2}], "next": 2})
+
+    @patch('llm_commands.api.Hotel.objects')
+    def test_detail_nests_current_results(self, mock_objects):
+        mock_objects.with_current_results.return_value.filter.return_value.values.return_value.first.return_value = {
+            "id": 1, "current_summary": "Short.", "current_rating": 4.0, "current_review": "Good.",
+        }
+        response = api.hotel_detail(self.factory.get("/api/hotels/1/"), 1)
+        self.assertEqual(json.loads(response.content), {
+            "id": 1, "summary": "Short.", "review": {"rating": 4.0, "review": "Good."},
+        })
+
+    @patch('llm_commands.api.Hotel.objects')
+    def test_export_streams_one_json_object_per_line(self, mock_objects):
+        values = mock_objects.order_by.return_value.filter.return_value.values.return_value
+        values.iterator.return_value = iter([{"id": 1, "price": 10.0}, {"id": 2, "price": None}])
+        response = api.hotel_export(self.factory.get("/api/hotels/export.ndjson"))
+        values.iterator.assert_called_once_with(chunk_size=api.EXPORT_CHUNK_SIZE)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{"id": 1, "price": 10.0}, {"id": 2, "price": None}])
+
+
+class TestAdminTuning(unittest.TestCase):
+    def postgres_paginator(self, plan_rows):
+        connection = MagicMock(vendor="postgresql")
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = [[{"Plan": {"Plan Rows": plan_rows}}]]
+        queryset = MagicMock(db="default")
+        queryset.query.sql_with_params.return_value = ("SELECT 1 FROM hotels", ())
+        queryset.__len__.return_value = 42  # Paginator's exact count falls back to len() on a mock
+        patcher = patch('llm_commands.admin.connections', {"default": connection})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return EstimatedCountPaginator(queryset, 50), cursor, queryset
+
+    def test_paginator_uses_planner_estimate_for_large_results(self):
+        paginator, cursor, queryset = self.postgres_paginator(2_500_000)
+        self.assertEqual(paginator.count, 2_500_000)
+        self.assertTrue(cursor.execute.call_args[0][0].startswith("EXPLAIN (FORMAT JSON) SELECT"))
+        queryset.count.assert_not_called()
+
+    def test_paginator_counts_small_results_exactly(self):
+        paginator, _, _ = self.postgres_paginator(120)
+        self.assertEqual(paginator.count, 42)
+
+    def test_rating_ranges_filter_without_distinct(self):
+        rating_filter = RatingRangeFilter(None, {"rating_range": ["4-4.5"]}, Hotel, None)
+        queryset = MagicMock()
+        rating_filter.queryset(None, queryset)
+        queryset.filter.assert_called_once_with(rating__gte=4.0)
+        queryset.filter.return_value.filter.assert_called_once_with(rating__lt=4.5)
+
+    def test_city_choices_are_cached(self):
+        settings = override_settings(CACHES=LOCMEM_CACHES)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        model_admin = MagicMock()
+        model_admin.model = MagicMock(_meta=Hotel._meta)
+        values = model_admin.model._default_manager.exclude.return_value.order_by.return_value.values_list.return_value
+        values.distinct.return_value = ["Dhaka", "Sylhet"]
+        city_filter = CityFilter(None, {}, Hotel, model_admin)
+        self.assertEqual(city_filter.lookups(None, model_admin), [("Dhaka", "Dhaka"), ("Sylhet", "Sylhet")])
+        self.assertEqual(city_filter.lookups(None, model_admin), [("Dhaka", "Dhaka"), ("Sylhet", "Sylhet")])
+        values.distinct.assert_called_once()
+
+
+class TestSearch(unittest.TestCase):
+    def test_fts5_query_quotes_every_word(self):
+        self.assertEqual(search.fts5_query('pool rooftop"s  OR -bar'), '"pool" "rooftop""s" "OR" "-bar"')
+
+    def test_blank_query_returns_nothing_without_querying(self):
+        with patch('llm_commands.search.connection') as mock_connection:
+            self.assertEqual(search.search_hotels("   ", ("id",)), [])
+        mock_connection.cursor.assert_not_called()
+
+    @patch('llm_commands.search.Hotel.objects')
+    def test_postgres_index_update_is_one_statement_per_chunk(self, mock_objects):
+        with patch('llm_commands.search.connection', MagicMock(vendor="postgresql")), \
+                patch('llm_commands.search.UPDATE_CHUNK_SIZE', 2), \
+                patch('llm_commands.search.search_vector', return_value="vector"):
+            search.update_search_index(iter([1, 2, 3]))
+        self.assertEqual([call.kwargs for call in mock_objects.filter.call_args_list], [{"pk__in": [1, 2]}, {"pk__in": [3]}])
+        mock_objects.filter.return_value.update.assert_called_with(search_vector="vector")
+
+    def test_sqlite_results_follow_bm25_rank(self):
+        mock_connection = MagicMock(vendor="sqlite")
+        cursor = mock_connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [(7, 3.5), (2, 1.0)]
+        with patch('llm_commands.search.connection', mock_connection), \
+                patch('llm_commands.search.Hotel.objects') as mock_objects:
+            mock_objects.filter.return_value.values.return_value = [
+                {"pk": 2, "property_title": "B"}, {"pk": 7, "property_title": "A"},
+            ]
+            results = search.search_hotels("pool", ("property_title",), limit=5)
+        self.assertEqual(cursor.execute.call_args[0][1][-2:], ['"pool"', 5])
+        self.assertEqual(results, [{"property_title": "A", "rank": 3.5}, {"property_title": "B", "rank": 1.0}])
+
+    def test_unsupported_database_gets_a_501(self):
+        request = RequestFactory().get("/api/hotels/search/", {"q": "pool"})
+        with patch('llm_commands.search.connection', MagicMock(vendor="mysql")):
+            response = api.hotel_search(request)
+            async_response = asyncio.run(api.ahotel_search(request))
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(async_response.status_code, 501)
+        self.assertIn("mysql", json.loads(response.content)["error"])
+
+
+@requires_scraper
+class TestScraperSchema(unittest.TestCase):
+    """The scraper's Core hotels table must match the Django model that owns it."""
+
+    django_types = {
+        "BigAutoField": BigInteger,
+        "CharField": String,
+        "TextField": Text,
+        "FloatField": Float,
+    }
+
+    def test_columns_match_the_hotel_model(self):
+        fields = {
+            field.column: field for field in Hotel._meta.concrete_fields
+            if field.name != "search_vector"
+        }
+        self.assertEqual(set(fields), set(hotels_table.c.keys()))
+        for name, field in fields.items():
+            column = hotels_table.c[name]
+            with self.subTest(column=name):
+                self.assertIsInstance(column.type, self.django_types[field.get_internal_type()])
+                self.assertEqual(column.nullable, field.null)
+                self.assertEqual(bool(column.unique), field.unique and not field.primary_key)
+                if isinstance(column.type, String) and not isinstance(column.type, Text):
+                    self.assertEqual(column.type.length, field.max_length)
+
+
+@requires_scraper
+class TestPostgresPipeline(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        scraper_metadata.create_all(self.engine)
+        self.spider = MagicMock()
+        self.pipeline = PostgresPipeline(engine=self.engine)
+        self.pipeline.open_spider(self.spider)
+
+    def item(self, **values):
+        return dict({"city_name": "Dhaka", "property_title": "Scraped Title", "hotel_id": "42", "price": 100.0}, **values)
+
+    def test_upsert_keeps_llm_owned_columns(self):
+        self.pipeline.process_item(self.item(), self.spider)
+        self.pipeline.flush(self.spider)
+        with self.engine.begin() as connection:
+            connection.execute(
+                hotels_table.update().values(property_title="Rewritten Title", description="Rewritten description.")
+            )
+
+        self.pipeline.process_item(self.item(price=80.0, rating=4.5), self.spider)
+        self.pipeline.flush(self.spider)
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(hotels_table)).mappings().all()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["property_title"], "Rewritten Title")
+        self.assertEqual(rows[0]["description"], "Rewritten description.")
+        self.assertEqual((rows[0]["price"], rows[0]["rating"]), (80.0, 4.5))
+        self.assertEqual(self.pipeline.rows_written, 2)
+
+    def test_missing_table_stops_the_crawl(self):
+        pipeline = PostgresPipeline(engine=create_engine("sqlite://"))
+        with self.assertRaises(CloseSpider):
+            pipeline.open_spider(self.spider)
+
+
+# A trimmed window.IBU_HOTEL payload from the Trip.com landing page.
+LANDING_PAYLOAD = {
+    "initData": {
+        "firstPageList": {"hotelList": [{
+            "cityName": "Dhaka",
+            "hotelName": "Pan Pacific Sonargaon",
+            "hotelId": 436187,
+            "price": "112",
+            "rating": "4.5",
+            "address": "107 Kazi Nazrul Islam Ave",
+            "latitude": 23.7508,
+            "longitude": 90.3925,
+            "roomType": "Deluxe King",
+            "imageUrl": "https://ak-d.tripcdn.com/images/436187.jpg",
+        }]},
+        "htlsData": {"inboundCities": [{"id": 1, "name": "Dhaka"}], "outboundCities": []},
+    },
+}
+
+
+@requires_scraper
+class TestAsyncHotelSpider(unittest.TestCase):
+    def response(self, payload):
+        body = f"<html><script>window.IBU_HOTEL = {json.dumps(payload)};</script></html>"
+        return HtmlResponse(url="https://uk.trip.com/hotels/", body=body, encoding="utf-8")
+
+    def test_first_page_items_match_the_hotels_table(self):
+        spider = AsyncHotelSpider(cities="Dhaka")
+        results = list(spider.parse(self.response(LANDING_PAYLOAD)))
+        items = [result for result in results if isinstance(result, dict)]
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]["property_title"], "Pan Pacific Sonargaon")
+        self.assertEqual((items[0]["price"], items[0]["rating"]), (112.0, 4.5))
+        self.assertLessEqual(set(items[0]), set(hotels_table.c.keys()))
+        self.assertEqual([request.meta["city_id"] for request in results[1:]], [1])
+
+
+@requires_scraper
+class TestCityExportPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.spider = MagicMock()
+        self.pipeline = CityExportPipeline(self.tmpdir.name, max_open_files=2)
+        self.pipeline.open_spider(self.spider)
+
+    def test_only_the_most_recent_files_stay_open(self):
+        for city in ("Dhaka", "Sylhet", "Khulna", "Dhaka"):
+            self.pipeline.process_item({"city_name": city, "hotel_id": city}, self.spider)
+        self.assertEqual(list(self.pipeline.files), ["khulna", "dhaka"])
+        self.pipeline.close_spider(self.spider)
+        with open(os.path.join(self.tmpdir.name, "dhaka.ndjson")) as f:
+            self.assertEqual([json.loads(line)["hotel_id"] for line in f], ["Dhaka", "Dhaka"])
+
+    def test_city_names_cannot_leave_the_export_dir(self):
+        self.pipeline.process_item({"city_name": "../New York/Queens", "hotel_id": "1"}, self.spider)
+        self.pipeline.close_spider(self.spider)
+        self.assertEqual(os.listdir(self.tmpdir.name), ["_new_york_queens.ndjson"])
+
+
 if __name__ == '__main__':
     unittest.main()
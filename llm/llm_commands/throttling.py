@@ -0,0 +1,55 @@
+import threading
+import time
+
+
+class AdaptiveTokenBucket:
+    """
+    Thread-safe token-bucket rate limiter for the Gemini API.
+
+    `acquire` blocks until a request may be sent. The refill rate is halved
+    whenever the API answers 429/503 (`throttled`) and grows back towards the
+    configured ceiling with every successful call (`succeeded`), so the
+    request rate settles just under the quota instead of using a fixed sleep.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=0.05, recovery_step=0.05):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(min_rate, self.rate)
+        self.recovery_step = recovery_step
+        self.capacity = float(burst) if burst else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available and consume it."""
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self, retry_after=None):
+        """Halve the rate after a 429/503 and hold back any queued burst."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                # Push the next token out until the server says we may retry.
+                self.tokens -= retry_after * self.rate
+
+    def succeeded(self):
+        """Additively grow the rate back towards the configured maximum."""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery_step)
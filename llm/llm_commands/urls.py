@@ -0,0 +1,26 @@
+from django.urls import path
+from . import api, views
+
+urlpatterns = [
+    # The read views are async: the app is served over ASGI, where a sync
+    # view runs in the worker's single sync thread, one request at a time.
+    path("", views.ahotel_list, name="hotel_list"),
+    path("hotel/<int:pk>/", views.ahotel_detail, name="hotel_detail"),
+    path("api/hotels/", api.ahotel_list, name="api_hotel_list"),
+    path("api/hotels/search/", api.ahotel_search, name="api_hotel_search"),
+    path("api/hotels/export.ndjson", api.ahotel_export, name="api_hotel_export"),
+    path("api/hotels/<int:pk>/", api.ahotel_detail, name="api_hotel_detail"),
+    path("hotel/add/", views.hotel_add, name="hotel_add"),
+    path("hotel/<int:pk>/edit/", views.hotel_edit, name="hotel_edit"),
+    path("hotel/<int:pk>/delete/", views.hotel_delete, name="hotel_delete"),
+    path("hotel/<int:hotel_id>/summary/", views.add_summary, name="add_summary"),
+    path("hotel/<int:hotel_id>/rating/", views.add_rating, name="add_rating"),
+    # Sync versions of the read views. They serve the same pages, so the two
+    # can be load-tested against each other (benchmarks/bench_web.py).
+    path("sync/", views.hotel_list, name="sync_hotel_list"),
+    path("sync/hotel/<int:pk>/", views.hotel_detail, name="sync_hotel_detail"),
+    path("sync/api/hotels/", api.hotel_list, name="sync_api_hotel_list"),
+    path("sync/api/hotels/search/", api.hotel_search, name="sync_api_hotel_search"),
+    path("sync/api/hotels/export.ndjson", api.hotel_export, name="sync_api_hotel_export"),
+    path("sync/api/hotels/<int:pk>/", api.hotel_detail, name="sync_api_hotel_detail"),
+]
@@ -1,30 +1,112 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect
+from django.template.loader import render_to_string
 from .models import Hotel, Summary, PropertyRating
 from .forms import HotelForm
+from .fragments import SCRAPED_FIELDS, fresh_fragment, hotel_fragment_key, invalidate_hotels, scraped_values
+from .search import update_search_index
 
-# List all hotels
+# Columns the hotel list renders; the rest (description, address, ...) stay in the database.
+LIST_FIELDS = ("id", "property_title", "city_name", "price", "rating")
+
+
+def parse_cursor(value):
+    """Return the pk to continue after, or None for the first page."""
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def hotel_page(request):
+    """
+    Return (queryset, after, page_size) for the hotel list page in `request`.
+
+    Keyset pagination on the primary key: ?after=<pk> continues after that
+    hotel, so every page is an index range scan rather than an OFFSET. The
+    queryset holds one extra row, which tells us whether there's a next page.
+    """
+    page_size = settings.HOTEL_PAGE_SIZE
+    after = parse_cursor(request.GET.get("after"))
+    hotels = Hotel.objects.only(*LIST_FIELDS).order_by("pk")
+    if after is not None:
+        hotels = hotels.filter(pk__gt=after)
+    return hotels[:page_size + 1], after, page_size
+
+
+def page_context(hotels, after, page_size):
+    return {
+        "hotels": hotels[:page_size],
+        "next_cursor": hotels[page_size - 1].pk if len(hotels) > page_size else None,
+        "is_first_page": after is None,
+    }
+
+
+# List hotels a page at a time
 def hotel_list(request):
-    hotels = Hotel.objects.all()
-    return render(request, "hotel_list.html", {"hotels": hotels})
+    hotels, after, page_size = hotel_page(request)
+    return render(request, "hotel_list.html", page_context(list(hotels), after, page_size))
+
+
+async def ahotel_list(request):
+    """Async hotel_list, for ASGI servers."""
+    hotels, after, page_size = hotel_page(request)
+    hotels = [hotel async for hotel in hotels]
+    return render(request, "hotel_list.html", page_context(hotels, after, page_size))
+
+
+def render_detail_fragment(hotel):
+    return render_to_string("hotel_detail_fragment.html", {"hotel": hotel})
+
 
 # View details of a specific hotel
 def hotel_detail(request, pk):
-    hotel = get_object_or_404(Hotel, pk=pk)
-    summaries = hotel.summaries.all()  # Get summaries for the hotel
-    ratings = hotel.ratings.all()  # Get ratings for the hotel
-    return render(request, "hotel_detail.html", {
-        "hotel": hotel,
-        "summaries": summaries,
-        "ratings": ratings,
-    })
+    """
+    The hotel and its current summary and rating are fetched in one query,
+    and the rendered fragment is cached until something writes to the hotel.
+    Scraper writes aren't invalidated, so a cache hit still reads the scraped
+    columns by primary key and re-renders the fragment if they changed.
+    """
+    scraped = Hotel.objects.filter(pk=pk).values_list(*SCRAPED_FIELDS).first()
+    if scraped is None:
+        raise Http404("No Hotel matches the given query.")
+    key = hotel_fragment_key(pk)
+    fragment = fresh_fragment(cache.get(key), scraped)
+    if fragment is None:
+        hotel = get_object_or_404(Hotel.objects.with_current_results(), pk=pk)
+        fragment = render_detail_fragment(hotel)
+        cache.set(key, (scraped_values(hotel), fragment))
+    return render(request, "hotel_detail.html", {"pk": pk, "fragment": fragment})
+
+
+async def ahotel_detail(request, pk):
+    """Async hotel_detail, for ASGI servers."""
+    scraped = await Hotel.objects.filter(pk=pk).values_list(*SCRAPED_FIELDS).afirst()
+    if scraped is None:
+        raise Http404("No Hotel matches the given query.")
+    key = hotel_fragment_key(pk)
+    fragment = fresh_fragment(await cache.aget(key), scraped)
+    if fragment is None:
+        try:
+            hotel = await Hotel.objects.with_current_results().aget(pk=pk)
+        except Hotel.DoesNotExist:
+            raise Http404("No Hotel matches the given query.")
+        fragment = render_detail_fragment(hotel)
+        await cache.aset(key, (scraped_values(hotel), fragment))
+    return render(request, "hotel_detail.html", {"pk": pk, "fragment": fragment})
+
 
 # Add a new hotel
 def hotel_add(request):
     if request.method == "POST":
         form = HotelForm(request.POST)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                hotel = form.save()
+                update_search_index([hotel.pk])
             return HttpResponseRedirect("/")
     else:
         form = HotelForm()
@@ -36,7 +118,10 @@ def hotel_edit(request, pk):
     if request.method == "POST":
         form = HotelForm(request.POST, instance=hotel)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                update_search_index([hotel.pk])
+                invalidate_hotels([hotel.pk])
             return HttpResponseRedirect("/")
     else:
         form = HotelForm(instance=hotel)
@@ -45,7 +130,10 @@ def hotel_edit(request, pk):
 # Delete a hotel
 def hotel_delete(request, pk):
     hotel = get_object_or_404(Hotel, pk=pk)
-    hotel.delete()
+    with transaction.atomic():
+        hotel.delete()
+        update_search_index([pk])  # drops the hotel's row from the SQLite search table
+        invalidate_hotels([pk])
     return HttpResponseRedirect("/")
 
 # Add a summary for a specific hotel
@@ -54,7 +142,12 @@ def add_summary(request, hotel_id):
     if request.method == "POST":
         summary_text = request.POST.get("summary")
         if summary_text:
-            Summary.objects.create(hotel=hotel, summary=summary_text)
+            with transaction.atomic():
+                # Only one summary per hotel may be current.
+                hotel.summaries.filter(is_current=True).update(is_current=False)
+                Summary.objects.create(property=hotel, summary=summary_text)
+                update_search_index([hotel.pk])
+                invalidate_hotels([hotel.pk])
             return HttpResponseRedirect(f"/hotel/{hotel.pk}/")
     return render(request, "add_summary.html", {"hotel": hotel})
 
@@ -65,6 +158,11 @@ def add_rating(request, hotel_id):
         rating = request.POST.get("rating")
         review = request.POST.get("review")
         if rating and review:
-            PropertyRating.objects.create(hotel=hotel, rating=float(rating), review=review)
+            with transaction.atomic():
+                # Only one rating per hotel may be current.
+                hotel.ratings.filter(is_current=True).update(is_current=False)
+                PropertyRating.objects.create(property=hotel, rating=float(rating), review=review)
+                update_search_index([hotel.pk])
+                invalidate_hotels([hotel.pk])
             return HttpResponseRedirect(f"/hotel/{hotel.pk}/")
     return render(request, "add_rating.html", {"hotel": hotel})
@@ -0,0 +1,125 @@
+import hashlib
+
+from llm_commands.models import ProcessingState
+
+
+def content_hash(*values):
+    """Hash the hotel fields a command's result depends on."""
+    material = "\x1f".join("" if value is None else str(value) for value in values)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class WorkState:
+    """
+    Per-hotel progress of one management command, stored in ProcessingState.
+
+    A hotel is skipped when its content hash matches the hash recorded by the
+    last successful run, or when it has failed `max_attempts` times without
+    its content changing. Progress is recorded as each hotel finishes, so a
+    crashed run resumes with the hotels it never reached.
+    """
+
+    def __init__(self, task, max_attempts=3, force=False, chunk_size=500):
+        self.task = task
+        self.max_attempts = max_attempts
+        self.force = force
+        self.chunk_size = chunk_size
+        self.seen = 0
+        self.skipped = 0
+
+    def is_current(self, input_hash, state):
+        """Return True if the recorded state means the hotel needs no work."""
+        if self.force or state is None or state.input_hash != input_hash:
+            return False
+        if state.status == ProcessingState.DONE:
+            return True
+        return state.attempts >= self.max_attempts
+
+    def pending(self, hotels, input_hash):
+        """
+        Yield the hotels that are new, changed, or still have failed attempts left.
+
+        `input_hash` maps a hotel to the hash of the content the command reads.
+        States are loaded in chunks with one query each.
+        """
+        chunk = []
+        for hotel in hotels:
+            self.seen += 1
+            chunk.append(hotel)
+            if len(chunk) >= self.chunk_size:
+                yield from self._pending_in_chunk(chunk, input_hash)
+                chunk = []
+        if chunk:
+            yield from self._pending_in_chunk(chunk, input_hash)
+
+    def _pending_in_chunk(self, hotels, input_hash):
+        states = {
+            state.hotel_id: state
+            for state in ProcessingState.objects.filter(
+                task=self.task, hotel_id__in=[hotel.id for hotel in hotels]
+            )
+        }
+        for hotel in hotels:
+            if self.is_current(input_hash(hotel), states.get(hotel.id)):
+                self.skipped += 1
+                continue
+            yield hotel
+
+    def mark_done(self, results):
+        """
+        Record successful runs for `(hotel, output_hash)` pairs with one upsert.
+
+        `output_hash` is the hash the next run will compare against. Call it
+        inside the transaction that writes the results, so a hotel is only
+        marked done once its results are saved.
+        """
+        self._save([
+            ProcessingState(
+                hotel_id=hotel.id,
+                task=self.task,
+                input_hash=output_hash,
+                status=ProcessingState.DONE,
+                attempts=0,
+                last_error="",
+            )
+            for hotel, output_hash in results
+        ])
+
+    def mark_failed(self, failures):
+        """
+        Record failed attempts for `(hotel, input_hash, error)` triples with one upsert.
+
+        Attempts count up while a hotel's content stays the same and restart
+        when it changes; the previous counts are read with one query.
+        """
+        failures = list(failures)
+        if not failures:
+            return
+        previous = {
+            state.hotel_id: state
+            for state in ProcessingState.objects.filter(
+                task=self.task, hotel_id__in=[hotel.id for hotel, _, _ in failures]
+            ).only("hotel", "input_hash", "attempts")
+        }
+        # Keyed by hotel, since one upsert can't touch the same row twice.
+        states = {}
+        for hotel, input_hash, error in failures:
+            state = previous.get(hotel.id)
+            attempts = state.attempts if state is not None and state.input_hash == input_hash else 0
+            states[hotel.id] = ProcessingState(
+                hotel_id=hotel.id,
+                task=self.task,
+                input_hash=input_hash,
+                status=ProcessingState.FAILED,
+                attempts=attempts + 1,
+                last_error=str(error),
+            )
+        self._save(list(states.values()))
+
+    def _save(self, states):
+        ProcessingState.objects.bulk_create(
+            states,
+            update_conflicts=True,
+            unique_fields=["hotel", "task"],
+            update_fields=["input_hash", "status", "attempts", "last_error", "last_processed_at"],
+        )
@@ -1,19 +1,19 @@
+import os
+from functools import lru_cache
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
-from .models import Base
 
-# Replace credentials with your PostgreSQL details
-DATABASE_URL = "postgresql+psycopg2://username:password@db:5432/hotel_db"
+# The docker-compose scrapy_app service sets DATABASE_URL; the default
+# matches its Postgres service.
+DATABASE_URL = os.environ.get("DATABASE_URL", "postgresql+psycopg2://username:password@db:5432/hotel_db")
 
-# Initialize the database engine
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
 
-# Create Database Engine and Base
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+@lru_cache(maxsize=None)
+def get_engine(url=None):
+    """
+    Return the engine for `url` (default DATABASE_URL), creating it once per URL.
 
-# Base = declarative_base()
-def init_db():
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Engines are lazy, so this doesn't connect or check the schema; run the
+    Django migrations to create the hotels table before scraping.
+    """
+    return create_engine(url or DATABASE_URL, pool_pre_ping=True)
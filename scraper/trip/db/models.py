@@ -1,20 +1,27 @@
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Float, Text,create_engine # Import Text explicitly
+from sqlalchemy import BigInteger, Column, Float, Integer, MetaData, String, Table, Text
 
-Base = declarative_base()
+metadata = MetaData()
 
-class Hotel(Base):
-
-    __tablename__ = 'hotels'
-
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    city_name = Column(String, nullable=False)
-    property_title = Column(String, nullable=False)
-    hotel_id = Column(String, unique=True, nullable=False)
-    price = Column(Float)
-    rating = Column(Float)
-    address = Column(Text)
-    latitude = Column(Float)
-    longitude = Column(Float)
-    room_type = Column(String)
-    image = Column(String)
+# The hotels table is owned by the Django app: llm/llm_commands/models.py
+# defines it and its migrations create and alter it. This is a Core mirror of
+# the columns the scraper writes; TestScraperSchema in llm_commands/tests.py
+# fails if it drifts from the model. The scraper never issues DDL against the
+# real database. The search_vector column is left out; a database trigger
+# fills it in for the hotels the scraper inserts (migration 0008).
+hotels = Table(
+    "hotels",
+    metadata,
+    # BIGINT isn't an alias for the rowid on SQLite, so it wouldn't autoincrement.
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("property_title", String(255), nullable=False),
+    Column("description", Text),
+    Column("city_name", String(255), nullable=False, index=True),
+    Column("hotel_id", String(255), nullable=False, unique=True),
+    Column("price", Float, index=True),
+    Column("rating", Float, index=True),
+    Column("address", String(255)),
+    Column("latitude", Float),
+    Column("longitude", Float),
+    Column("room_type", String(255)),
+    Column("image", String(255)),
+)
@@ -0,0 +1,55 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speed-up
+    orjson = None
+
+MARKER = "window.IBU_HOTEL"
+
+_decoder = json.JSONDecoder()
+
+
+def _payload_start(text):
+    """Return the offset of the `{` assigned to window.IBU_HOTEL, skipping look-alikes."""
+    marker = text.find(MARKER)
+    while marker != -1:
+        after = marker + len(MARKER)
+        start = text.find("{", after)
+        if start == -1:
+            return None
+        if text[after:start].strip() == "=":
+            return start
+        marker = text.find(MARKER, after)
+    return None
+
+
+def extract_ibu_hotel(text):
+    """
+    Return the `window.IBU_HOTEL` object embedded in a Trip.com page, or None.
+
+    The assignment is located with str.find and the object is decoded in
+    place with JSONDecoder.raw_decode, so the page is scanned once and no
+    regex runs over the multi-megabyte script. When orjson is installed the
+    script body is handed to it first.
+    """
+    start = _payload_start(text)
+    if start is None:
+        return None
+
+    if orjson is not None:
+        end = text.find("</script>", start)
+        candidate = text[start:end if end != -1 else len(text)].rstrip().rstrip(";").rstrip()
+        # Only worth trying when the object is the last thing in the script.
+        if candidate.endswith("}"):
+            try:
+                data = orjson.loads(candidate)
+                return data if isinstance(data, dict) else None
+            except orjson.JSONDecodeError:
+                pass  # More statements follow the object; fall back to raw_decode.
+
+    try:
+        data, _ = _decoder.raw_decode(text, start)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
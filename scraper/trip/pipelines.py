@@ -1,17 +1,39 @@
+import json
 import os
+import time
+from collections import OrderedDict
+import scrapy
+from scrapy.exceptions import CloseSpider
 from scrapy.pipelines.images import ImagesPipeline
-from sqlalchemy.exc import IntegrityError
-from .db.database import engine, SessionLocal, init_db
-from trip.db.models import Hotel
+from sqlalchemy import inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from .db.database import get_engine
+from .db.models import hotels
+
+
+def file_name(name):
+    """Make a scraped name usable as one path component, e.g. not "..", "a/b" or ".hidden"."""
+    return name.replace(" ", "_").replace("/", "_").replace("\\", "_").lstrip(".") or "_"
 
 
 class HotelImagesPipeline(ImagesPipeline):
+    """
+    Download each hotel's image through Scrapy's scheduler and downloader.
+
+    Image requests share the crawler's concurrency limits, so downloads run
+    alongside page crawling without blocking the reactor.
+    """
+
+    def get_media_requests(self, item, info):
+        image_url = item.get("image")
+        if image_url:
+            yield scrapy.Request(image_url)
+
     def file_path(self, request, response=None, info=None, *, item=None):
-        # Generate a file path for each image
-        city_name = item.get("city_name", "unknown").lower().replace(" ", "_")
-        hotel_name = item.get("property_title", "hotel").lower().replace(" ", "_")
-        filename = f"{hotel_name}_{os.path.basename(request.url)}"
-        return f"images/{city_name}/{filename}"
+        # Match the existing layout: <city>/<hotel_id>_<hotel_name>.jpg
+        city_name = file_name(item.get("city_name") or "unknown").lower()
+        hotel_name = file_name(item.get("property_title") or "hotel")
+        return f"{city_name}/{item.get('hotel_id')}_{hotel_name}.jpg"
 
     def item_completed(self, results, item, info):
         # Retrieve and store the image path
@@ -21,36 +43,322 @@ class HotelImagesPipeline(ImagesPipeline):
         return item
 
 
+class CityExportPipeline:
+    """
+    Append each hotel to its city's newline-delimited JSON file as it is scraped.
+
+    Files live in CITY_EXPORT_DIR as <city>.ndjson and are appended to across
+    crawls. Once the active file reaches CITY_EXPORT_MAX_BYTES it is renamed to
+    <city>.<n>.ndjson and a fresh file is started, so readers should glob
+    <city>*.ndjson. With CITY_EXPORT_PARQUET enabled (requires pyarrow), each
+    city is also written to <city>.<crawl start>.parquet in row groups of
+    CITY_EXPORT_PARQUET_BATCH hotels. Only one row group per city is ever
+    held in memory.
+
+    At most CITY_EXPORT_MAX_OPEN_FILES files of each kind are kept open; the
+    least recently written one is closed to make room, so crawling every
+    city doesn't run into the process's file descriptor limit. A closed
+    NDJSON file is reopened for appending; a city whose Parquet writer was
+    closed continues in <city>.<crawl start>.<n>.parquet.
+    """
+
+    parquet_columns = {
+        "city_name": "string",
+        "property_title": "string",
+        "hotel_id": "string",
+        "price": "float64",
+        "rating": "float64",
+        "address": "string",
+        "latitude": "float64",
+        "longitude": "float64",
+        "room_type": "string",
+        "image": "string",
+        "image_path": "string",
+    }
+
+    def __init__(self, export_dir, max_bytes=64 * 1024 * 1024, parquet=False, parquet_batch=1000,
+                 max_open_files=64):
+        self.export_dir = export_dir
+        self.max_bytes = max_bytes
+        self.max_open_files = max(1, max_open_files)
+        self.parquet = parquet
+        self.parquet_batch = max(1, parquet_batch)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            export_dir=settings.get("CITY_EXPORT_DIR", "city_data/json_of_hotels"),
+            max_bytes=settings.getint("CITY_EXPORT_MAX_BYTES", 64 * 1024 * 1024),
+            parquet=settings.getbool("CITY_EXPORT_PARQUET", False),
+            parquet_batch=settings.getint("CITY_EXPORT_PARQUET_BATCH", 1000),
+            max_open_files=settings.getint("CITY_EXPORT_MAX_OPEN_FILES", 64),
+        )
+
+    def open_spider(self, spider):
+        os.makedirs(self.export_dir, exist_ok=True)
+        # Open files by city, least recently written first
+        self.files = OrderedDict()
+        self.parquet_writers = OrderedDict()
+        self.parquet_parts = {}
+        self.parquet_rows = {}
+        self.crawl_started = time.strftime("%Y%m%dT%H%M%S")
+        if self.parquet:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                spider.logger.warning("CITY_EXPORT_PARQUET is enabled but pyarrow is not installed; skipping Parquet export.")
+                self.parquet = False
+
+    def close_spider(self, spider):
+        for city_key in list(self.parquet_rows):
+            self.flush_parquet(city_key)
+        for writer in self.parquet_writers.values():
+            writer.close()
+        for handle in self.files.values():
+            handle.close()
+
+    def process_item(self, item, spider):
+        city_key = file_name(item.get("city_name") or "unknown").lower()
+        line = json.dumps(dict(item), ensure_ascii=False, separators=(",", ":")) + "\n"
+        self.write_line(city_key, line.encode("utf-8"))
+
+        if self.parquet:
+            rows = self.parquet_rows.setdefault(city_key, [])
+            rows.append(item)
+            if len(rows) >= self.parquet_batch:
+                self.flush_parquet(city_key)
+        return item
+
+    def ndjson_path(self, city_key, part=None):
+        suffix = f".{part}" if part is not None else ""
+        return os.path.join(self.export_dir, f"{city_key}{suffix}.ndjson")
+
+    @staticmethod
+    def make_room(open_files, limit):
+        """Close the least recently written files until another one can be opened."""
+        while len(open_files) >= limit:
+            _, handle = open_files.popitem(last=False)
+            handle.close()
+
+    def write_line(self, city_key, data):
+        handle = self.files.get(city_key)
+        if handle is None:
+            self.make_room(self.files, self.max_open_files)
+            handle = self.files[city_key] = open(self.ndjson_path(city_key), "ab")
+        else:
+            self.files.move_to_end(city_key)
+        if handle.tell() and handle.tell() + len(data) > self.max_bytes:
+            handle = self.rotate(city_key)
+        handle.write(data)
+
+    def rotate(self, city_key):
+        """
+        Move the full active file aside as the next numbered part and reopen.
+        """
+        self.files.pop(city_key).close()
+        part = 1
+        while os.path.exists(self.ndjson_path(city_key, part)):
+            part += 1
+        os.replace(self.ndjson_path(city_key), self.ndjson_path(city_key, part))
+        handle = self.files[city_key] = open(self.ndjson_path(city_key), "ab")
+        return handle
+
+    def flush_parquet(self, city_key):
+        """
+        Write the buffered hotels of one city as a Parquet row group.
+        """
+        rows = self.parquet_rows.pop(city_key, [])
+        if not rows:
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in self.parquet_columns.items()])
+        columns = {
+            name: [self.parquet_value(row.get(name), kind) for row in rows]
+            for name, kind in self.parquet_columns.items()
+        }
+        table = pa.Table.from_pydict(columns, schema=schema)
+
+        writer = self.parquet_writers.get(city_key)
+        if writer is None:
+            self.make_room(self.parquet_writers, self.max_open_files)
+            part = self.parquet_parts[city_key] = self.parquet_parts.get(city_key, 0) + 1
+            suffix = f".{part}" if part > 1 else ""
+            path = os.path.join(self.export_dir, f"{city_key}.{self.crawl_started}{suffix}.parquet")
+            writer = self.parquet_writers[city_key] = pq.ParquetWriter(path, schema)
+        else:
+            self.parquet_writers.move_to_end(city_key)
+        writer.write_table(table)
+
+    @staticmethod
+    def parquet_value(value, kind):
+        if value is None or value == "":
+            return None
+        if kind == "float64":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+        return str(value)
+
+
 class PostgresPipeline:
-    def __init__(self):
-        # Create tables if they don't exist
-        init_db()
+    """
+    Buffer scraped hotels and upsert them into the hotels table in batches.
+
+    A batch is flushed when it reaches POSTGRES_BATCH_SIZE items, when
+    POSTGRES_FLUSH_INTERVAL seconds have passed since the last flush, and
+    when the spider closes. Each flush is a single
+    INSERT ... ON CONFLICT (hotel_id) DO UPDATE, so re-scraped hotels are
+    refreshed instead of failing on the unique constraint. Both Postgres and
+    SQLite support that statement; pass `engine` to write somewhere other
+    than DATABASE_URL (e.g. SQLite in the benchmarks).
+
+    The table itself is created by the Django migrations, so the pipeline
+    issues no DDL and writes through a Core statement built once per dialect.
+    """
+
+    upsert_dialects = {
+        "postgresql": postgresql.insert,
+        "sqlite": sqlite.insert,
+    }
+    # Upsert statements shared by every pipeline, keyed by dialect name.
+    upsert_statements = {}
+
+    columns = (
+        "property_title",
+        "city_name",
+        "hotel_id",
+        "price",
+        "rating",
+        "address",
+        "latitude",
+        "longitude",
+        "room_type",
+        "image",
+    )
+    # Columns rewrite_hotel_data owns once a hotel exists. They're written on
+    # insert but left alone on conflict, so a re-crawl neither undoes the
+    # rewrite nor changes the content hash the LLM commands skip unchanged
+    # hotels by.
+    llm_columns = ("property_title", "description")
+
+    def __init__(self, batch_size=500, flush_interval=5.0, engine=None, database_url=None):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.engine = engine if engine is not None else get_engine(database_url)
+        self.upsert_statement = self.build_upsert_statement(self.engine.dialect.name)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            batch_size=crawler.settings.getint("POSTGRES_BATCH_SIZE", 500),
+            flush_interval=crawler.settings.getfloat("POSTGRES_FLUSH_INTERVAL", 5.0),
+            database_url=crawler.settings.get("DATABASE_URL"),
+        )
+
+    @classmethod
+    def build_upsert_statement(cls, dialect_name):
+        """
+        Build the INSERT ... ON CONFLICT statement once per dialect and reuse it for every batch.
+
+        Existing hotels get the scraped columns refreshed; `llm_columns` keep
+        their rewritten values.
+        """
+        statement = cls.upsert_statements.get(dialect_name)
+        if statement is None:
+            insert = cls.upsert_dialects[dialect_name](hotels)
+            statement = cls.upsert_statements[dialect_name] = insert.on_conflict_do_update(
+                index_elements=[hotels.c.hotel_id],
+                set_={
+                    column: insert.excluded[column]
+                    for column in cls.columns
+                    if column != "hotel_id" and column not in cls.llm_columns
+                },
+            )
+        return statement
 
     def open_spider(self, spider):
-        # Open a database session
-        self.session = SessionLocal()
+        # The Django migrations create the table; without it every batch and
+        # its row-by-row retry would fail and each item would be dropped.
+        if not inspect(self.engine).has_table(hotels.name):
+            raise CloseSpider(f"{hotels.name} table missing - run manage.py migrate first")
+        # Hotels waiting to be written, keyed by hotel_id so that a hotel seen
+        # twice in one batch is only upserted once (Postgres rejects that).
+        self.buffer = {}
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_seconds = 0.0
 
     def close_spider(self, spider):
-        # Close the database session
-        self.session.close()
+        self.flush(spider)
+        rows_per_second = self.rows_written / self.write_seconds if self.write_seconds else 0.0
+        spider.logger.info(
+            f"Upserted {self.rows_written} hotels in {self.batches_written} batches "
+            f"({self.write_seconds:.2f}s in the database, {rows_per_second:.1f} rows/s)"
+        )
 
     def process_item(self, item, spider):
+        hotel_id = item.get("hotel_id")
+        if not hotel_id:
+            spider.logger.warning(f"Skipping hotel without hotel_id: {item.get('property_title')}")
+            return item
+
+        self.buffer[str(hotel_id)] = self.to_row(item)
+        if (
+            len(self.buffer) >= self.batch_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush(spider)
+        return item
+
+    def to_row(self, item):
+        """
+        Map a scraped item onto the hotels table columns.
+        """
+        row = {column: item.get(column) for column in self.columns}
+        row["hotel_id"] = str(row["hotel_id"])
+        return row
+
+    def flush(self, spider):
+        """
+        Write the buffered hotels with one upsert statement.
+        """
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+
+        rows = list(self.buffer.values())
+        self.buffer = {}
+        started = time.monotonic()
         try:
-            hotel = Hotel(
-            property_title=item.get("property_title"),
-            city_name=item.get("city_name"),
-            hotel_id=item.get("hotel_id"),
-            price=item.get("price"),
-            rating=item.get("rating"),
-            address=item.get("address"),
-            latitude=item.get("latitude"),
-            longitude=item.get("longitude"),
-            room_type=item.get("room_type"),
-            image=item.get("image"),
-            )
-            self.session.add(hotel)
-            self.session.commit()
+            with self.engine.begin() as connection:
+                connection.execute(self.upsert_statement, rows)
+            written = len(rows)
         except Exception as e:
-            self.session.rollback()
-            spider.logger.error(f"Failed to save hotel: {e}")
-         
\ No newline at end of file
+            spider.logger.error(f"Failed to save batch of {len(rows)} hotels, retrying one by one: {e}")
+            written = self.flush_rows_individually(rows, spider)
+
+        elapsed = time.monotonic() - started
+        self.rows_written += written
+        self.batches_written += 1
+        self.write_seconds += elapsed
+        spider.logger.debug(f"Flushed {written} hotels in {elapsed:.3f}s")
+
+    def flush_rows_individually(self, rows, spider):
+        """
+        Fall back to one upsert per row so a single bad hotel doesn't drop the whole batch.
+        """
+        written = 0
+        for row in rows:
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(self.upsert_statement, row)
+                written += 1
+            except Exception as e:
+                spider.logger.error(f"Failed to save hotel {row['hotel_id']}: {e}")
+        return written
@@ -1,13 +1,52 @@
+import os
+
 BOT_NAME = 'trip'
 
 SPIDER_MODULES = ['trip.spiders']
 NEWSPIDER_MODULE = 'trip.spiders'
 
 ITEM_PIPELINES = {
+    'trip.pipelines.HotelImagesPipeline': 200,
     'trip.pipelines.PostgresPipeline': 300,
+    'trip.pipelines.CityExportPipeline': 400,
 }
 
 
 IMAGES_STORE = 'city_data/images_of_hotels'
 
-DATABASE_URL = 'postgresql://username:password@db:5432/hotel_db' 
+# SQLAlchemy URL PostgresPipeline writes to; run the Django migrations
+# against the same database first, they own the hotels table.
+DATABASE_URL = os.environ.get('DATABASE_URL', 'postgresql+psycopg2://username:password@db:5432/hotel_db')
+
+# Hotels are buffered by PostgresPipeline and upserted in batches; a batch is
+# written once it holds this many items or this many seconds have passed.
+POSTGRES_BATCH_SIZE = 500
+POSTGRES_FLUSH_INTERVAL = 5.0
+
+# Crawl many cities in parallel while letting AutoThrottle back off if
+# Trip.com starts responding slowly.
+CONCURRENT_REQUESTS = 32
+CONCURRENT_REQUESTS_PER_DOMAIN = 16
+DOWNLOAD_DELAY = 0
+AUTOTHROTTLE_ENABLED = True
+AUTOTHROTTLE_START_DELAY = 0.5
+AUTOTHROTTLE_MAX_DELAY = 10
+AUTOTHROTTLE_TARGET_CONCURRENCY = 8.0
+RETRY_TIMES = 3
+
+# Hotel images are fetched by HotelImagesPipeline through the downloader;
+# cap how many run at once against the image CDN.
+DOWNLOAD_SLOTS = {
+    'ak-d.tripcdn.com': {'concurrency': 8},
+}
+
+# Per-city exports written by CityExportPipeline: compact newline-delimited
+# JSON, rotated into numbered parts once a file reaches CITY_EXPORT_MAX_BYTES.
+# Set CITY_EXPORT_PARQUET = True (needs pyarrow) for a columnar copy as well.
+CITY_EXPORT_DIR = 'city_data/json_of_hotels'
+CITY_EXPORT_MAX_BYTES = 64 * 1024 * 1024
+CITY_EXPORT_PARQUET = False
+CITY_EXPORT_PARQUET_BATCH = 1000
+# Files kept open at once; the least recently written city's file is closed
+# (and reopened when needed) beyond this.
+CITY_EXPORT_MAX_OPEN_FILES = 64
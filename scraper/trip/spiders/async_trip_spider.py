@@ -1,39 +1,59 @@
+import math
 import scrapy
-import json
-import re
 import random
-import os
-import asyncio
-import aiohttp
+import weakref
+from trip.payload import extract_ibu_hotel
 
 class AsyncHotelSpider(scrapy.Spider):
     """
-    Spider for scraping hotel data from Trip.com with async image downloading.
+    Spider for scraping hotel data from Trip.com.
+
+    Hotel images are downloaded by HotelImagesPipeline through the crawler's
+    own downloader, so they overlap with page requests.
     """
     name = "async_trip"
     start_urls = ["https://uk.trip.com/hotels/?locale=en-GB&curr=GBP"]
 
+    def __init__(self, cities=None, top=None, sample=3, max_pages=None, *args, **kwargs):
+        """
+        Choose which cities to crawl:
+
+        -a cities=all             every inbound and outbound city
+        -a cities=Dhaka,London    an explicit list of city names or ids
+        -a top=10                 the first 10 cities in the site's order
+        -a sample=3               a random sample (the default)
+
+        Each city's hotel list is paginated until a page adds no new hotels,
+        or until -a max_pages=N pages have been fetched.
+        """
+        super().__init__(*args, **kwargs)
+        self.cities = cities
+        self.top = int(top) if top else None
+        self.sample = int(sample)
+        self.max_pages = int(max_pages) if max_pages else None
+        self.seen_hotel_ids = {}
+        # Parsed window.IBU_HOTEL payloads, dropped with their responses
+        self.payloads = weakref.WeakKeyDictionary()
+
     def parse(self, response):
         """
         Parse the main page and extract city data.
         """
-        script_data = self.extract_script_data(response)
-        if not script_data:
+        data = self.extract_payload(response)
+        if not data:
             self.logger.warning("No script data found. Cannot extract hotel data.")
             return
 
         try:
-            # Load JSON string into a Python dictionary
-            data = json.loads(script_data)
             hotel_list = data.get("initData", {}).get("firstPageList", {}).get("hotelList", [])
 
             for hotel in hotel_list:
                 item = {
                     "city_name": hotel.get("cityName", ""),
-                    "property_name": hotel.get("hotelName", ""),  # Update to match SQLAlchemy model
+                    "property_title": hotel.get("hotelName", ""),
                     "hotel_id": hotel.get("hotelId", ""),
-                    "price": hotel.get("price", 0),
-                    "rating": float(hotel.get("rating", 0.0)),
+                    "price": self.to_float(hotel.get("price")),
+                    "rating": self.to_float(hotel.get("rating")),
                     "address": hotel.get("address", ""),
                     "latitude": hotel.get("latitude", 0.0),
                     "longitude": hotel.get("longitude", 0.0),
@@ -42,26 +62,17 @@ class AsyncHotelSpider(scrapy.Spider):
                 }
                 self.logger.info(f"Yielding item: {item}")
                 yield item
-        except json.JSONDecodeError as e:
-            self.logger.error(f"JSON Decode Error: {e}")
         except Exception as e:
             self.logger.error(f"Unexpected error during parsing: {e}")
 
-        script_data = self.extract_script_data(response)
-        if not script_data:
-            self.logger.warning("No valid script data found.")
-            return
-
         try:
-            ibu_hotel_data = self.parse_json_data(script_data)
-            cities_to_search = self.get_cities(ibu_hotel_data)
+            cities_to_search = self.get_cities(data)
 
-            if len(cities_to_search) < 3:
-                self.logger.warning("Not enough cities to choose 3.")
+            selected_cities = self.select_cities(cities_to_search)
+            if not selected_cities:
+                self.logger.warning("No cities matched the requested selection.")
                 return
 
-            # Randomly select 3 cities
-            selected_cities = random.sample(cities_to_search, 3)
             for city in selected_cities:
                 city_name = city.get("name", "Unknown")
                 city_id = city.get("id", "")
@@ -69,88 +80,99 @@ class AsyncHotelSpider(scrapy.Spider):
                     self.logger.warning(f"No ID found for city: {city_name}")
                     continue
 
-                city_hotels_url = f"https://uk.trip.com/hotels/list?city={city_id}"
                 self.logger.info(f"Requesting data for city: {city_name}")
-                yield scrapy.Request(
-                    url=city_hotels_url,
-                    callback=self.parse_city_hotels,
-                    meta={'city_name': city_name, 'city_id': city_id}
-                )
+                yield self.city_page_request(city_name, city_id, 1)
         except Exception as e:
             self.logger.error(f"Unexpected error during parsing: {e}")
 
+    def select_cities(self, cities):
+        """
+        Apply the cities/top/sample spider arguments to the available cities.
+        """
+        # The same city can be listed as both inbound and outbound.
+        unique_cities = list({str(city.get("id")): city for city in cities}.values())
+
+        if self.cities == "all":
+            return unique_cities
+        if self.cities:
+            wanted = {name.strip().lower() for name in self.cities.split(",") if name.strip()}
+            return [
+                city for city in unique_cities
+                if str(city.get("name", "")).lower() in wanted or str(city.get("id", "")) in wanted
+            ]
+        if self.top:
+            return unique_cities[:self.top]
+        if len(unique_cities) < self.sample:
+            self.logger.warning(f"Not enough cities to choose {self.sample}; crawling all {len(unique_cities)}.")
+            return unique_cities
+        return random.sample(unique_cities, self.sample)
+
+    def city_page_request(self, city_name, city_id, page):
+        """
+        Build the request for one page of a city's hotel list.
+        """
+        url = f"https://uk.trip.com/hotels/list?city={city_id}"
+        if page > 1:
+            url = f"{url}&pageIndex={page}"
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_city_hotels,
+            meta={'city_name': city_name, 'city_id': city_id, 'page': page}
+        )
+
     def parse_city_hotels(self, response):
         """
-        Parse the city hotels page and save data.
+        Parse a page of a city's hotel list and yield its hotels.
+
+        Items are written out by the pipelines as they are yielded
+        (CityExportPipeline for the per-city files, PostgresPipeline for the
+        database), so nothing is accumulated per city here.
         """
         city_name = response.meta.get('city_name', 'Unknown')
-        script_data = self.extract_script_data(response)
+        city_id = response.meta.get('city_id', '')
+        page = response.meta.get('page', 1)
+        ibu_hotel_data = self.extract_payload(response)
 
-        output_folder = self.create_folders(city_name)
-        city_json_path = os.path.join(output_folder['json'], f"{city_name.lower().replace(' ', '_')}.json")
-        city_hotels = []
-        
-        if script_data:
+        if ibu_hotel_data:
             try:
-                ibu_hotel_data = self.parse_json_data(script_data)
                 hotel_list = self.extract_hotel_list(ibu_hotel_data)
 
-                # Process and save hotel data
-                city_hotels = [self.process_hotel(hotel, city_name, output_folder['images']) for hotel in hotel_list]
-                # Process hotel details and yield each
+                # Process hotel details and yield each hotel not seen on an earlier page
+                seen = self.seen_hotel_ids.setdefault(city_id, set())
+                new_hotels = 0
                 for hotel in hotel_list:
-                    hotel_data = self.process_hotel(hotel, city_name, output_folder['images'])
-                    yield hotel_data  # Ensure this line is indented properly
-                # Save hotel data to JSON file
-                self.save_to_json(city_hotels, city_json_path)
-
-                # Download images asynchronously
-                asyncio.run(self.download_images(city_hotels))
-
-                self.logger.info(f"Data saved for city {city_name} in {city_json_path}")
+                    hotel_data = self.process_hotel(hotel, city_name)
+                    if hotel_data["hotel_id"] in seen:
+                        continue
+                    seen.add(hotel_data["hotel_id"])
+                    new_hotels += 1
+                    yield hotel_data
+
+                self.logger.info(f"Scraped {new_hotels} hotels from page {page} for city {city_name}")
+
+                # Keep paginating until a page adds nothing new
+                if new_hotels and (self.max_pages is None or page < self.max_pages):
+                    yield self.city_page_request(city_name, city_id, page + 1)
             except Exception as e:
                 self.logger.error(f"Error processing hotels for city {city_name}: {e}")
         else:
             self.logger.warning(f"No script data found for city: {city_name}")
 
     # Utility Methods
-    # def extract_script_data(self, response):
-    #     """
-    #     Extract `window.IBU_HOTEL` script data from the response.
-    #     """
-    #     return response.css("script::text").re_first(r"window\.IBU_HOTEL\s*=\s*(\{.*?\});")
-    def extract_script_data(self, response):
+    def extract_payload(self, response):
         """
-        Extract the script content containing the JSON data as a string.
-        """
-        script_content = response.xpath(
-            '//script[contains(text(), "window.IBU_HOTEL")]/text()'
-        ).get()
-
-        if not script_content:
-            self.logger.warning("Script content not found. Check the XPath selector.")
-            return None
-
-        # Extract the JSON-like content as a string
-        match = re.search(r"window\.IBU_HOTEL\s*=\s*(\{.*?\});", script_content, re.DOTALL)
-        if match:
-            self.logger.info("Successfully extracted script data.")
-            return match.group(1)  # Return JSON string
-        else:
-            self.logger.warning("No match for window.IBU_HOTEL.")
-            return None
+        Return the parsed `window.IBU_HOTEL` payload of a response.
 
-
-
-    def parse_json_data(self, script_data):
-        """
-        Parse JSON-like script data.
+        Each response is parsed at most once; later calls reuse the result.
         """
-        try:
-            return json.loads(script_data)
-        except json.JSONDecodeError as e:
-            self.logger.error(f"Failed to parse JSON: {e}")
-            return {}
+        if response in self.payloads:
+            return self.payloads[response]
+
+        data = extract_ibu_hotel(response.text)
+        if data is None:
+            self.logger.warning("No window.IBU_HOTEL payload found in the response.")
+        self.payloads[response] = data
+        return data
 
     def get_cities(self, data):
         """
@@ -160,78 +182,45 @@ class AsyncHotelSpider(scrapy.Spider):
         outbound = data.get("initData", {}).get("htlsData", {}).get("outboundCities", [])
         return inbound + outbound
 
-    def create_folders(self, city_name):
-        """
-        Create directories for JSON and image storage.
-        """
-        output_folder = os.path.join(os.getcwd(), 'city_data')
-        json_dir = os.path.join(output_folder, 'json_of_hotels')
-        images_dir = os.path.join(output_folder, 'images_of_hotels', city_name.lower().replace(' ', '_'))
-
-        os.makedirs(json_dir, exist_ok=True)
-        os.makedirs(images_dir, exist_ok=True)
-
-        return {'json': json_dir, 'images': images_dir}
-
     def extract_hotel_list(self, data):
         """
         Extract hotel list from JSON data.
         """
         return data.get("initData", {}).get("firstPageList", {}).get("hotelList", [])
 
-    def process_hotel(self, hotel, city_name, images_dir):
+    @staticmethod
+    def to_float(value):
+        """
+        Coerce a numeric field to float, or None when it is missing or not a number.
+
+        Trip.com sends "" for hotels without a price or rating; storing None
+        keeps those rows valid for the numeric database columns.
+        """
+        if value is None or isinstance(value, bool):
+            return None
+        try:
+            number = float(str(value).strip().replace(",", ""))
+        except ValueError:
+            return None
+        return number if math.isfinite(number) else None
+
+    def process_hotel(self, hotel, city_name):
         """
         Process hotel details.
         """
         hotel_id = hotel.get("hotelBasicInfo", {}).get("hotelId", "")
-        hotel_name = hotel.get("hotelBasicInfo", {}).get("hotelName", "").replace(" ", "_")
         image_url = hotel.get("hotelBasicInfo", {}).get("hotelImg", "")
+        coordinate = hotel.get("positionInfo", {}).get("coordinate", {})
 
         return {
             "city_name": city_name,
             "property_title": hotel.get("hotelBasicInfo", {}).get("hotelName", ""),
             "hotel_id": hotel_id,
-            "price": hotel.get("hotelBasicInfo", {}).get("price", ""),
-            "rating": hotel.get("commentInfo", {}).get("commentScore", ""),
+            "price": self.to_float(hotel.get("hotelBasicInfo", {}).get("price")),
+            "rating": self.to_float(hotel.get("commentInfo", {}).get("commentScore")),
             "address": hotel.get("positionInfo", {}).get("positionName", ""),
-            "latitude": hotel.get("positionInfo", {}).get("coordinate", {}).get("lat", ""),
-            "longitude": hotel.get("positionInfo", {}).get("coordinate", {}).get("lng", ""),
+            "latitude": self.to_float(coordinate.get("lat")),
+            "longitude": self.to_float(coordinate.get("lng")),
             "room_type": hotel.get("roomInfo", {}).get("physicalRoomName", ""),
             "image": image_url,
         }
-    
-    async def download_images(self, hotel_list):
-        """
-        Download hotel images asynchronously.
-        """
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            for hotel in hotel_list:
-                if hotel["image"] and hotel["image_path"]:
-                    tasks.append(self.download_image(session, hotel["image"], hotel["image_path"]))
-            await asyncio.gather(*tasks)
-
-    async def download_image(self, session, url, path):
-        """
-        Download a single image asynchronously.
-        """
-        try:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    with open(path, 'wb') as f:
-                        f.write(await response.read())
-                    self.logger.info(f"Image saved: {path}")
-                else:
-                    self.logger.warning(f"Failed to download image: {url}")
-        except Exception as e:
-            self.logger.error(f"Error downloading image {url}: {e}")
-
-    def save_to_json(self, data, path):
-        """
-        Save hotel data to a JSON file.
-        """
-        try:
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            self.logger.error(f"Error saving JSON to {path}: {e}")
\ No newline at end of file